@@ -0,0 +1,71 @@
+"""Display names for raw model (checkpoint) names.
+
+Rows keep the raw name a model was evaluated under; the `model_aliases`
+table maps it to the name the viewer shows. Renaming a model is then one
+row written to that table (see scripts/rename_models.py) instead of an
+UPDATE over every row it scored, so its indexes, leaderboard rows and FTS
+index stay untouched. Pages resolve names through `model_aliases`, a dict
+cached per DB version; the federated view joins the table (see
+federation.py).
+
+Within a DB aliases are one-to-one: no two models may show under the same
+name, since the leaderboard, dropdowns and compare group by raw name
+(`display_owner` finds clashes). Across DBs they may coincide, and the
+federated view merges such models.
+"""
+from cache import LRUCache, db_cached
+
+ALIAS_TABLE = 'model_aliases'
+
+alias_cache = LRUCache(maxsize=64)
+
+
+def has_aliases(conn, schema='main'):
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                        (ALIAS_TABLE,)).fetchone() is not None
+
+
+def ensure_alias_table(conn):
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {ALIAS_TABLE} (
+        model_name TEXT PRIMARY KEY,
+        display_name TEXT NOT NULL
+    ) WITHOUT ROWID''')
+
+
+def load_aliases(conn):
+    """{raw model name: display name}; empty if the DB has no alias table."""
+    if not has_aliases(conn):
+        return {}
+    return {row[0]: row[1] for row in conn.execute(f'SELECT model_name, display_name FROM {ALIAS_TABLE}')}
+
+
+def model_aliases(conn):
+    """`load_aliases` for a pooled connection, cached until the DB changes."""
+    return db_cached(alias_cache, conn, ALIAS_TABLE, lambda: load_aliases(conn))
+
+
+def display_name_sql(schema, column):
+    """SQL for the display name of `column` (qualify it), looked up in `schema`'s alias table."""
+    return (f'COALESCE((SELECT display_name FROM {schema}.{ALIAS_TABLE} a WHERE a.model_name = {column}), '
+            f'{column})')
+
+
+def display_owner(aliases, models, model_name, display_name):
+    """The other model of `models` already shown as `display_name` under `aliases`, or None."""
+    for other in sorted(set(models) | set(aliases)):
+        if other != model_name and aliases.get(other, other) == display_name:
+            return other
+    return None
+
+
+def set_alias(conn, model_name, display_name):
+    ensure_alias_table(conn)
+    conn.execute(f'INSERT OR REPLACE INTO {ALIAS_TABLE} (model_name, display_name) VALUES (?, ?)',
+                 (model_name, display_name))
+
+
+def remove_alias(conn, model_name):
+    """Drop `model_name`'s alias; returns whether it had one."""
+    if not has_aliases(conn):
+        return False
+    return conn.execute(f'DELETE FROM {ALIAS_TABLE} WHERE model_name = ?', (model_name,)).rowcount > 0
@@ -0,0 +1,307 @@
+"""JSON / NDJSON endpoints mirroring the HTML views.
+
+Every endpoint accepts the same filter arguments as its view, including
+the `q` text search. Responses
+carry an ETag derived from the DB file version and the query string, so
+pollers get a bodyless 304 until the DB changes, and are gzip-compressed
+when the client accepts it. `format=ndjson`, `format=csv` and (with
+pyarrow installed) `format=parquet` stream every matching row instead of
+one page, in constant memory; the list pages link to the CSV and Parquet
+exports of their current filter.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import zlib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from cache import cached_response, response_cache
+from db import DEFAULT_DB, file_version, get_db, pool, request_db_name
+from queries import fetch_page, score_stats
+from threads import PROVISIONED_COLUMNS
+from views import detect_spec, filter_query, has_score, page_arg, table_info
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Endpoint -> DB it reads when the request names none. Which table and
+# filters apply is decided by the DB's schema (views.detect_spec).
+ENDPOINTS = {
+    'results': DEFAULT_DB,
+    'evaluations': 'evaluations.db',
+    'conversations': 'pt_pt_conversation_evaluations.db',
+}
+
+MAX_PER_PAGE = 1000
+STREAM_BATCH = 1000
+# Rows per Parquet row group
+PARQUET_BATCH = 50000
+
+
+def _int_arg(name, default):
+    """Integer query arg `name`, or a 400 if it is not one."""
+    try:
+        return int(request.args.get(name, default))
+    except ValueError:
+        abort(400, f'{name} must be an integer')
+
+
+def _gzip_ok():
+    return 'gzip' in request.accept_encodings
+
+
+def _content_encoding():
+    """'gzip' or 'identity': how this request's body is sent (Parquet is compressed already)."""
+    return 'gzip' if request.args.get('format') != 'parquet' and _gzip_ok() else 'identity'
+
+
+def _etag(db_name):
+    # Each encoding of a URL is a different body, so it gets its own tag
+    args = sorted(request.args.items(multi=True))
+    key = json.dumps([request.path, os.path.abspath(db_name), file_version(db_name), args, _content_encoding()])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag):
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'})
+    return None
+
+
+def _json_response(payload, etag):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    response = Response(body, mimetype='application/json')
+    if _content_encoding() == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+
+def _ndjson_response(db_name, query, params, etag):
+    compress = _content_encoding() == 'gzip'
+
+    def generate():
+        # Own connection: the request's pooled ones are released before streaming ends
+        with pool.connection(db_name) as conn:
+            encoder = zlib.compressobj(5, zlib.DEFLATED, 31) if compress else None
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                if not rows:
+                    break
+                chunk = ''.join(json.dumps(dict(row), ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+                if encoder:
+                    chunk = encoder.compress(chunk) + encoder.flush(zlib.Z_SYNC_FLUSH)
+                yield chunk
+            if encoder:
+                yield encoder.flush()
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+
+def _csv_response(db_name, query, params, etag):
+    compress = _content_encoding() == 'gzip'
+
+    def generate():
+        with pool.connection(db_name) as conn:
+            encoder = zlib.compressobj(5, zlib.DEFLATED, 31) if compress else None
+            cursor = conn.execute(query, params)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(col[0] for col in cursor.description)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                writer.writerows(rows)
+                chunk = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                if encoder:
+                    chunk = encoder.compress(chunk) + encoder.flush(zlib.Z_SYNC_FLUSH)
+                yield chunk
+                if not rows:
+                    break
+            if encoder:
+                yield encoder.flush()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Disposition'] = f'attachment; filename="{os.path.splitext(db_name)[0]}.csv"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last `take`."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        chunk = b''.join(self._chunks)
+        self._chunks = []
+        return chunk
+
+
+def _arrow_type(declared):
+    # SQLite type affinity rules, by declared column type
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+
+def _parquet_response(db_name, query, params, types, etag):
+    def generate():
+        with pool.connection(db_name) as conn:
+            cursor = conn.execute(query, params)
+            columns = [col[0] for col in cursor.description]
+            schema = pa.schema([(col, _arrow_type(types.get(col, ''))) for col in columns])
+            sink = _ChunkSink()
+            with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+                while True:
+                    rows = cursor.fetchmany(PARQUET_BATCH)
+                    if not rows:
+                        break
+                    arrays = []
+                    for i, field in enumerate(schema):
+                        values = [row[i] for row in rows]
+                        if pa.types.is_string(field.type):
+                            # Untyped columns may hold numbers; keep them as text
+                            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+                        arrays.append(pa.array(values, type=field.type))
+                    writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                    yield sink.take()
+            yield sink.take()
+
+    response = Response(stream_with_context(generate()), mimetype='application/vnd.apache.parquet')
+    response.headers['Content-Disposition'] = f'attachment; filename="{os.path.splitext(db_name)[0]}.parquet"'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+
+def _rows(name):
+    db_name = request_db_name(ENDPOINTS[name])
+    etag = _etag(db_name)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    conn = get_db(db_name)
+    spec = detect_spec(conn)
+    if spec is None:
+        abort(404)
+    _, _, where, params = filter_query(conn, spec, request.args)
+    # The same columns whether or not the DB has been provisioned yet
+    columns = [name for name, _ in table_info(conn, spec.table) if name not in PROVISIONED_COLUMNS]
+    if spec.key[-1][0] == 'rowid':
+        columns.insert(0, 'rowid')
+
+    output = request.args.get('format')
+    if output in ('ndjson', 'csv', 'parquet'):
+        order = ', '.join(f"{col} {'DESC' if spec.descending else 'ASC'}" for col, _ in spec.key)
+        query = f"SELECT {', '.join(columns)} FROM {spec.table}{where} ORDER BY {order}"
+        if output == 'csv':
+            return _csv_response(db_name, query, params, etag)
+        if output == 'parquet':
+            if pq is None:
+                abort(501, 'Parquet export needs pyarrow')
+            types = {'rowid': 'INTEGER', **dict(table_info(conn, spec.table))}
+            return _parquet_response(db_name, query, params, types, etag)
+        return _ndjson_response(db_name, query, params, etag)
+
+    # At least one row: LIMIT 0 has no pages, and a negative LIMIT means no limit at all
+    per_page = max(1, min(_int_arg('per_page', 50), MAX_PER_PAGE))
+    page = page_arg(request.args)
+    # The page cursors need every sort key column, provisioned or not
+    select = ', '.join(columns + [col for col, _ in spec.key if col not in columns])
+    total_count = conn.execute(f'SELECT COUNT(*) FROM {spec.table}{where}', params).fetchone()[0]
+    rows, prev_cursor, next_cursor = fetch_page(conn.cursor(), spec.table, where, params, spec.key, spec.descending,
+                                                per_page, page, request.args.get('after', ''),
+                                                request.args.get('before', ''), select)
+    return _json_response({
+        'db': db_name,
+        'total_count': total_count,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total_count + per_page - 1) // per_page,
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
+        'rows': [{col: row[col] for col in columns} for row in rows],
+    }, etag)
+
+
+@bp.route('/results')
+@cached_response(lambda: request_db_name(ENDPOINTS['results']), encoding=_content_encoding)
+def results():
+    return _rows('results')
+
+
+@bp.route('/evaluations')
+@cached_response(lambda: request_db_name(ENDPOINTS['evaluations']), encoding=_content_encoding)
+def evaluations():
+    return _rows('evaluations')
+
+
+@bp.route('/conversations')
+@cached_response(lambda: request_db_name(ENDPOINTS['conversations']), encoding=_content_encoding)
+def conversations():
+    return _rows('conversations')
+
+
+@bp.route('/stats')
+@cached_response(encoding=_content_encoding)
+def stats():
+    db_name = request_db_name(DEFAULT_DB)
+    etag = _etag(db_name)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    conn = get_db(db_name)
+    spec = detect_spec(conn)
+    if spec is None:
+        abort(404)
+    _, _, where, params = filter_query(conn, spec, request.args)
+    if not has_score(conn, spec):
+        total_count = conn.execute(f'SELECT COUNT(*) FROM {spec.table}{where}', params).fetchone()[0]
+        return _json_response({'db': db_name, 'total_count': total_count}, etag)
+    return _json_response({'db': db_name, **score_stats(conn.cursor(), spec.table, where, params)}, etag)
+
+
+@bp.route('/cache')
+def cache():
+    """Hit/miss counters and size of the response cache."""
+    return response_cache.stats()
@@ -0,0 +1,228 @@
+"""In-process caches for values and responses derived from a DB file."""
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+from db import file_version, request_db_name, served_db
+from streaming import accepted_encoding
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit/miss counters."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        # Concurrent misses may both compute; the results are identical.
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def db_cached(cache, conn, name, compute):
+    """Cache `compute()` for the file version `conn` was opened on.
+
+    Entries for older versions of the file are never hit again and fall out
+    of the LRU on their own.
+    """
+    return cache.get_or_compute((conn.db_path, conn.db_version, name), compute)
+
+
+class ResponseCache(LRUCache):
+    """LRU of rendered responses, bounded by entry count and total body size.
+
+    With `path`, entries are also kept in a SQLite file: they survive
+    restarts and are shared by every worker process on the machine.
+    """
+
+    def __init__(self, maxsize=512, maxbytes=64 * 1024 * 1024, path=None):
+        super().__init__(maxsize)
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.path = path
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute('PRAGMA journal_mode = WAL')
+            self._disk.execute('PRAGMA synchronous = OFF')
+            self._disk.execute('''CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                used REAL
+            )''')
+
+    @staticmethod
+    def _disk_key(key):
+        return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+    def _remember(self, key, value):
+        # Caller holds the lock
+        if key in self._data:
+            self.nbytes -= len(self._data.pop(key)[2])
+        self._data[key] = value
+        self.nbytes += len(value[2])
+        while len(self._data) > self.maxsize or self.nbytes > self.maxbytes:
+            self.nbytes -= len(self._data.popitem(last=False)[1][2])
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            if self._disk is not None:
+                disk_key = self._disk_key(key)
+                row = self._disk.execute('SELECT status, headers, body FROM responses WHERE key = ?',
+                                         (disk_key,)).fetchone()
+                if row is not None:
+                    self._disk.execute('UPDATE responses SET used = ? WHERE key = ?', (time.time(), disk_key))
+                    value = (row[0], json.loads(row[1]), row[2])
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store `value`, a `(status, headers, body)` tuple."""
+        if len(value[2]) > self.maxbytes:
+            return
+        with self._lock:
+            self._remember(key, value)
+            if self._disk is not None:
+                self._disk.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                   (self._disk_key(key), value[0], json.dumps(value[1]), value[2], time.time()))
+                # Drop the least recently used entries beyond the size budget
+                self._disk.execute('''DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(length(body)) OVER (ORDER BY used DESC) AS total,
+                               ROW_NUMBER() OVER (ORDER BY used DESC) AS rn
+                        FROM responses)
+                    WHERE total > ? OR rn > ?)''', (self.maxbytes, self.maxsize))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            if self._disk is not None:
+                self._disk.execute('DELETE FROM responses')
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._data),
+            'bytes': self.nbytes,
+            'maxsize': self.maxsize,
+            'maxbytes': self.maxbytes,
+            'path': self.path,
+        }
+
+
+# RESPONSE_CACHE_MB=0 disables response caching; RESPONSE_CACHE_PATH adds the on-disk tier
+response_cache = ResponseCache(maxbytes=int(float(os.environ.get('RESPONSE_CACHE_MB', 64)) * 1024 * 1024),
+                               path=os.environ.get('RESPONSE_CACHE_PATH') or None)
+
+
+def _tee(chunks, maxbytes, store):
+    """Pass `chunks` through, then `store` their concatenation unless it outgrew `maxbytes` or was cut short."""
+    body, size = [], 0
+    try:
+        for chunk in chunks:
+            if body is not None:
+                size += len(chunk)
+                if size <= maxbytes:
+                    body.append(chunk)
+                else:
+                    body = None
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    if body is not None:
+        store(b''.join(body))
+
+
+def cached_response(db_name=None, cache=response_cache, encoding=accepted_encoding):
+    """Serve a view from `cache` while its DB file is unchanged.
+
+    The key is the route, the non-empty query args (sorted), the encoding
+    the response is sent with, the list of DBs on offer and the version of
+    the DB the view reads. `db_name` names that DB: a file name, a function
+    of the view's arguments, or None for the `db` query arg. `encoding`
+    returns the Content-Encoding the view answers this request with; the
+    default suits views that compress with `accepted_encoding`. Only 200
+    responses are stored; streamed HTML pages once they have been sent in
+    full, other streams (exports) never.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            name = db_name(**kwargs) if callable(db_name) else db_name or request_db_name()
+            if not cache.maxbytes or not served_db(name):
+                return view(**kwargs)
+            key = (request.path,
+                   tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v != '')),
+                   encoding(),
+                   tuple(sorted(f for f in os.listdir('.') if f.endswith('.db'))),
+                   os.path.abspath(name),
+                   file_version(name))
+            cached = cache.get(key)
+            if cached is not None:
+                status, headers, body = cached
+                response = Response(body, status=status, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response.make_conditional(request)
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                headers = [[k, v] for k, v in response.headers.items() if k.lower() != 'content-length']
+                # Only streamed pages: exports stream to keep memory flat and are never buffered
+                if response.is_streamed and response.mimetype == 'text/html':
+                    response.response = _tee(response.response, cache.maxbytes,
+                                             lambda body: cache.set(key, (200, headers, body)))
+                elif not response.is_streamed:
+                    cache.set(key, (200, headers, response.get_data()))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+"""Head-to-head comparison of two models on the items both were scored on.
+
+Rows are paired on the table's item key (the prompt, or the conversation
+turn), averaging repeated scores of the same item, so the per-item deltas
+are computed by one indexed join instead of per model listings.
+"""
+from leaderboard import summary_source
+from significance import bootstrap_ci, paired_permutation_test
+
+# (table, item key columns) tried in order; the first one the DB has is used
+ITEM_KEYS = (
+    ('results', ('doc_internal_id',)),
+    ('evaluations', ('conversation_id', 'turn_number')),
+    ('evaluations', ('doc_id',)),
+)
+
+# Deltas closer to zero than this count as ties
+TIE_EPSILON = 1e-9
+
+
+def item_key(conn):
+    """Return (table, key columns) for this DB, or None if it has no usable key."""
+    for table, key in ITEM_KEYS:
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if {'model_name', 'score', *key} <= columns:
+            return table, key
+    return None
+
+
+def paired_scores(conn, model_a, model_b):
+    """Pair the scores of two models on their shared items.
+
+    Returns a list of dicts with the key columns, `group` (the leaderboard
+    breakdown column, e.g. category), `score_a`, `score_b` and
+    `delta` (b - a), sorted by delta so B's largest regressions come first.
+    """
+    found = item_key(conn)
+    if found is None:
+        return []
+    table, key = found
+    source = summary_source(conn)
+    group = source[1] if source and source[0] == table else None
+    cols = ', '.join(key)
+    group_expr = f"COALESCE(CAST(MAX({group}) AS TEXT), '')" if group else "''"
+    per_item = f'''
+        SELECT {cols}, {group_expr} AS grp, AVG(score) AS score
+        FROM {table}
+        WHERE model_name = ? AND score IS NOT NULL
+        GROUP BY {cols}
+    '''
+    query = f'''
+        WITH a AS ({per_item}), b AS ({per_item})
+        SELECT {', '.join(f'a.{col}' for col in key)}, a.grp, a.score, b.score, b.score - a.score AS delta
+        FROM a JOIN b USING ({cols})
+        ORDER BY delta, {', '.join(f'a.{col}' for col in key)}
+    '''
+    pairs = []
+    for row in conn.execute(query, (model_a, model_b)):
+        values = tuple(row)
+        item = dict(zip(key, values))
+        item.update(group=values[-4], score_a=values[-3], score_b=values[-2], delta=values[-1])
+        pairs.append(item)
+    return pairs
+
+
+def outcome_counts(pairs):
+    """Return {'wins', 'ties', 'losses'} from B's point of view."""
+    counts = {'wins': 0, 'ties': 0, 'losses': 0}
+    for pair in pairs:
+        if abs(pair['delta']) <= TIE_EPSILON:
+            counts['ties'] += 1
+        elif pair['delta'] > 0:
+            counts['wins'] += 1
+        else:
+            counts['losses'] += 1
+    return counts
+
+
+def summarize_pairs(pairs):
+    """Overall and per-group summary rows.
+
+    Each has n, mean_a, mean_b, mean_delta, the outcome counts, `delta_ci`
+    (bootstrap interval of the mean delta) and `p_value` (paired permutation
+    test); the last two are None without NumPy.
+    """
+    groups = {}
+    for pair in pairs:
+        groups.setdefault('', []).append(pair)
+        if pair['group'] != '':
+            groups.setdefault(pair['group'], []).append(pair)
+    summary = []
+    for name in sorted(groups):
+        members = groups[name]
+        n = len(members)
+        deltas = [p['delta'] for p in members]
+        intervals = bootstrap_ci(deltas)
+        summary.append({
+            'group': name,
+            'n': n,
+            'mean_a': sum(p['score_a'] for p in members) / n,
+            'mean_b': sum(p['score_b'] for p in members) / n,
+            'mean_delta': sum(deltas) / n,
+            **outcome_counts(members),
+            'delta_ci': intervals['mean_ci'] if intervals else None,
+            'p_value': paired_permutation_test(deltas),
+        })
+    return summary
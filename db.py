@@ -0,0 +1,276 @@
+"""SQLite helpers shared by the viewer and the maintenance scripts."""
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+import click
+from flask import g, request
+
+import storage
+from leaderboard import ensure_leaderboard
+from search import ensure_fts
+from storage import register_functions
+from threads import ensure_conversation_num
+
+DEFAULT_DB = 'new_results.db'
+
+logger = logging.getLogger(__name__)
+
+# Composite indexes matched to the filter and sort combinations the views
+# issue. Both `evaluations.db` and the pt-pt conversations DB use a table
+# called `evaluations`, so an index is only created when the table actually
+# has every listed column. Trailing `score` columns make the stats query
+# covering for the filters in front of it; (model_name, item key) ones serve
+# the pairing in compare.py. The `conversation_num` ones serve the
+# conversation list and thread views (see threads.py).
+INDEXES = {
+    'results': [
+        ('model_name', 'category', 'score'),
+        ('model_name', 'doc_internal_id'),
+        ('category', 'score'),
+        ('score',),
+    ],
+    'evaluations': [
+        ('model_name', 'group_name', 'score'),
+        ('model_name', 'doc_id', 'score'),
+        ('group_name', 'score'),
+        ('model_name', 'conversation_id', 'turn_number', 'used_pt_pt_prompt', 'score'),
+        ('conversation_id', 'turn_number', 'used_pt_pt_prompt', 'score'),
+        ('conversation_num', 'used_pt_pt_prompt', 'turn_number'),
+        ('model_name', 'conversation_num', 'used_pt_pt_prompt', 'turn_number'),
+        ('used_pt_pt_prompt', 'score'),
+        ('score',),
+    ],
+}
+
+# Any other table with these columns (a benchmark DB the viewer has no
+# dedicated view for) gets these
+GENERIC_INDEXES = [
+    ('model_name', 'score'),
+    ('score',),
+]
+
+_provisioned = {}
+_provision_lock = threading.Lock()
+
+
+def table_columns(conn, table):
+    """Column names of `table` (generated ones included), or an empty set if it does not exist."""
+    return {row[1] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+
+
+def index_name(table, columns):
+    return f"idx_{table}_{'_'.join(columns)}"
+
+
+def ensure_indexes(conn):
+    """Create any missing viewer indexes and refresh planner statistics.
+
+    Returns the names of the indexes that were created.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND sql NOT LIKE 'CREATE VIRTUAL%'")]
+    created = []
+    for table in tables:
+        # A compact table's indexes live on its store (see storage.py)
+        indexes = INDEXES.get(storage.logical_table(table), GENERIC_INDEXES)
+        columns = table_columns(conn, table)
+        for cols in indexes:
+            name = index_name(table, cols)
+            if name in existing or not set(cols) <= columns:
+                continue
+            conn.execute(f"CREATE INDEX {name} ON {table} ({', '.join(cols)})")
+            created.append(name)
+    analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if created or not analyzed:
+        conn.execute('ANALYZE')
+    conn.commit()
+    return created
+
+
+def file_version(db_path):
+    """Identify the current contents of a DB file by (mtime, size)."""
+    st = os.stat(db_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def served_db(db_name):
+    """Whether `db_name` is a .db file in the working directory, the only files the viewer opens."""
+    return db_name.endswith('.db') and db_name in os.listdir('.')
+
+
+def provision(db_path):
+    """Run `ensure_conversation_num`, `ensure_indexes`, `ensure_leaderboard` and `ensure_fts`
+    once per version of the file. Returns the names of the indexes created.
+
+    Databases on read-only media are left alone; the viewer still works
+    against them, just without the extra indexes, summaries and search index.
+
+    This writes to the file, so it runs ahead of serving (`flask
+    ensure-indexes`, or `python main.py` before the server starts), never
+    while the pool's read-only connections are reading it.
+    """
+    with _provision_lock:
+        if _provisioned.get(db_path) == file_version(db_path):
+            return []
+        try:
+            conn = register_functions(sqlite3.connect(db_path))
+            try:
+                ensure_conversation_num(conn)
+                created = ensure_indexes(conn)
+                ensure_leaderboard(conn)
+                ensure_fts(conn)
+            finally:
+                conn.close()
+        except sqlite3.OperationalError as e:
+            # Not recorded as done: the next call tries again
+            logger.warning('Skipping index provisioning for %s: %s', db_path, e)
+            return []
+        _provisioned[db_path] = file_version(db_path)
+        if created:
+            logger.info('Created %d indexes in %s: %s', len(created), db_path, ', '.join(created))
+        return created
+
+
+class PooledConnection(sqlite3.Connection):
+    """Read-only connection that remembers which file version it was opened on."""
+    db_path = None
+    db_version = None
+
+
+class ConnectionPool:
+    """Per-process pool of read-only connections, keyed by DB file.
+
+    Connections are handed to one request at a time and kept open between
+    requests so their page cache and prepared statements stay warm. When the
+    file's mtime or size changes, idle connections for it are dropped and
+    the next request opens a fresh one. The pool never provisions a DB (see
+    `provision`).
+
+    `immutable=True` opens files with SQLite's `immutable=1`, which skips
+    locking entirely; only use it for DBs nothing writes to while the
+    viewer runs. `factory` is the connection class (a PooledConnection
+    subclass, see profiling.py).
+    """
+
+    def __init__(self, immutable=False, mmap_size=256 * 1024 * 1024, cache_kib=64 * 1024, max_idle=8,
+                 factory=PooledConnection):
+        self.immutable = immutable
+        self.factory = factory
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _open(self, db_path, version):
+        uri = f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro'
+        if self.immutable:
+            uri += '&immutable=1'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        register_functions(conn)
+        conn.execute(f'PRAGMA mmap_size = {self.mmap_size}')
+        conn.execute(f'PRAGMA cache_size = -{self.cache_kib}')
+        conn.execute('PRAGMA query_only = 1')
+        conn.db_path = db_path
+        conn.db_version = version
+        return conn
+
+    def acquire(self, db_path):
+        version = file_version(db_path)
+        with self._lock:
+            idle = self._idle.get(db_path, [])
+            while idle:
+                conn = idle.pop()
+                if conn.db_version == version:
+                    return conn
+                conn.close()
+        return self._open(db_path, version)
+
+    def release(self, db_path, conn):
+        with self._lock:
+            idle = self._idle.setdefault(db_path, [])
+            if conn.db_version == file_version(db_path) and len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self, db_path):
+        conn = self.acquire(db_path)
+        try:
+            yield conn
+        finally:
+            self.release(db_path, conn)
+
+    def close_all(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+# Set SQLITE_IMMUTABLE=1 when the .db files never change while the viewer runs
+pool = ConnectionPool(immutable=os.environ.get('SQLITE_IMMUTABLE') == '1')
+
+
+def request_db_name(default=DEFAULT_DB):
+    """The DB file named by the `db` query arg, or `default` unless it names a served DB (see `served_db`)."""
+    db_name = request.args.get('db', default)
+    return db_name if served_db(db_name) else default
+
+
+def get_db(db_name=None):
+    """Pooled connection for this request; `db_name` defaults to the `db` query arg."""
+    if db_name is None:
+        db_name = request_db_name()
+    conn = pool.acquire(db_name)
+    g.setdefault('db_connections', []).append((db_name, conn))
+    return conn
+
+
+def release_db(exception=None):
+    for db_name, conn in g.pop('db_connections', []):
+        pool.release(db_name, conn)
+
+
+@click.command('ensure-indexes')
+@click.argument('db_files', nargs=-1)
+def ensure_indexes_command(db_files):
+    """Provision each DB (default: every .db here) ahead of serving it: indexes, summaries, search index."""
+    for db_name in db_files or sorted(f for f in os.listdir('.') if f.endswith('.db')):
+        created = provision(db_name)
+        print(f"{db_name}: provisioned, {len(created)} indexes created")
+
+
+@click.command('compact-storage')
+@click.argument('db_files', nargs=-1)
+@click.option('--codec', type=click.Choice(sorted(storage.CODECS)), default='zlib', help='Compression for long text')
+def compact_storage_command(db_files, codec):
+    """Move results to the deduplicated, compressed layout and VACUUM (default: every .db here)."""
+    if codec == 'zstd' and storage.zstandard is None:
+        raise click.UsageError('--codec zstd needs the zstandard package')
+    for db_name in db_files or sorted(f for f in os.listdir('.') if f.endswith('.db')):
+        before = os.path.getsize(db_name)
+        conn = register_functions(sqlite3.connect(db_name))
+        compacted = [table for table in storage.COMPACT_TABLES if storage.compact(conn, table, codec)]
+        if compacted:
+            ensure_indexes(conn)
+            ensure_fts(conn)
+            conn.execute('VACUUM')
+        conn.close()
+        print(f"{db_name}: {', '.join(compacted) or 'nothing'} compacted, "
+              f"{before / 1e6:.1f} MB -> {os.path.getsize(db_name) / 1e6:.1f} MB")
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
+    app.cli.add_command(ensure_indexes_command)
+    app.cli.add_command(compact_storage_command)
@@ -0,0 +1,138 @@
+"""Query every DB in the working directory through one connection.
+
+All `.db` files are ATTACHed read-only to in-memory connections, at most
+MAX_ATTACHED per connection, and a schema adapter per table type maps each
+one onto a common `scores` view:
+
+    source, kind, model_name, category, score, norm_score
+
+`norm_score` maps every benchmark's scale onto 0-100, bottom to top (a 1-5
+score of 1 is 0, of 3 is 50), so per-model results can be compared and
+averaged across benchmarks with one query per connection. The connections
+are cached and rebuilt only when a file is added, removed or modified.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from aliases import display_name_sql, has_aliases
+from db import PooledConnection, file_version, pool
+from storage import register_functions
+
+# (kind, table, columns that identify the table type, category expression).
+# Tried in order: the conversation DB also has an `evaluations` table.
+ADAPTERS = (
+    ('conversations', 'evaluations', ('conversation_id', 'turn_number', 'used_pt_pt_prompt'),
+     "CASE WHEN used_pt_pt_prompt THEN 'PT-PT prompt' ELSE 'Default prompt' END"),
+    ('evaluations', 'evaluations', ('group_name',), 'group_name'),
+    ('results', 'results', ('category',), 'category'),
+)
+
+# SQLite's default limit on attached databases
+MAX_ATTACHED = 10
+
+# The benchmarks' score scales as (bottom, top), smallest first
+SCALES = ((1, 5), (0, 10), (0, 100))
+
+
+def score_scale(conn, schema, table):
+    """(bottom, top) of the score scale used by a table: the first of SCALES its highest score fits.
+
+    Only the top is read from the data; a 0-10 table where no row scored 0
+    is still normalized from 0.
+    """
+    top = conn.execute(f'SELECT MAX(score) FROM {schema}.{table}').fetchone()[0] or 0
+    return next((scale for scale in SCALES if top <= scale[1]), SCALES[-1])
+
+
+def adapt(conn, schema, source):
+    """SELECT mapping one attached DB onto the `scores` columns, or None if no adapter fits."""
+    for kind, table, identifying, category in ADAPTERS:
+        columns = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info({table})')}
+        if {'model_name', 'score', *identifying} <= columns:
+            bottom, top = score_scale(conn, schema, table)
+            quoted = source.replace("'", "''")
+            # Renamed models are listed, and merged across DBs, under their display names
+            model = display_name_sql(schema, 't.model_name') if has_aliases(conn, schema) else 'model_name'
+            return (f"SELECT '{quoted}' AS source, '{kind}' AS kind, {model} AS model_name, "
+                    f"COALESCE(CAST({category} AS TEXT), '') AS category, score, "
+                    f"(score - {bottom}) * {100 / (top - bottom)} AS norm_score "
+                    f"FROM {schema}.{table} t WHERE score IS NOT NULL")
+    return None
+
+
+class Federation:
+    """Cached read-only connections with every DB attached, MAX_ATTACHED per connection.
+
+    Queries are serialized on the shared connections; results built from
+    them should be cached (each one's `db_version` covers its attached files).
+    """
+    factory = PooledConnection
+
+    def __init__(self):
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def _open(self, versions):
+        conn = sqlite3.connect('file::memory:', uri=True, check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        # Compact DBs' views call inflate() (see storage.py)
+        register_functions(conn)
+        parts = []
+        for i, (db_path, _) in enumerate(versions):
+            uri = f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro'
+            if pool.immutable:
+                uri += '&immutable=1'
+            conn.execute('ATTACH DATABASE ? AS ?', (uri, f'db{i}'))
+            part = adapt(conn, f'db{i}', db_path)
+            if part:
+                parts.append(part)
+        if parts:
+            conn.execute(f"CREATE TEMP VIEW scores AS {' UNION ALL '.join(parts)}")
+        else:
+            conn.execute('CREATE TEMP VIEW scores AS SELECT NULL AS source, NULL AS kind, NULL AS model_name, '
+                         'NULL AS category, NULL AS score, NULL AS norm_score WHERE 0')
+        conn.execute('PRAGMA query_only = 1')
+        conn.db_path = 'federated'
+        conn.db_version = versions
+        return conn
+
+    @contextmanager
+    def connections(self, db_paths):
+        """Yield a list of connections that between them have every one of `db_paths` attached.
+
+        Each DB is attached to exactly one of them, so per-source results
+        of each connection can simply be concatenated.
+        """
+        db_paths = sorted(db_paths)
+        batches = [tuple((db_path, file_version(db_path)) for db_path in db_paths[i:i + MAX_ATTACHED])
+                   for i in range(0, len(db_paths), MAX_ATTACHED)]
+        with self._lock:
+            conns = []
+            for i, versions in enumerate(batches):
+                conn = self._conns[i] if i < len(self._conns) else None
+                if conn is None or conn.db_version != versions:
+                    if conn is not None:
+                        conn.close()
+                    conn = self._open(versions)
+                conns.append(conn)
+            for conn in self._conns[len(batches):]:
+                conn.close()
+            self._conns = conns
+            yield conns
+
+
+federation = Federation()
+
+
+def model_scores(conn):
+    """Per (model, source) normalized mean, raw mean and n from the `scores` view."""
+    query = '''
+        SELECT model_name, source, kind, COUNT(*) AS n, AVG(score) AS mean, AVG(norm_score) AS norm_mean
+        FROM scores
+        GROUP BY model_name, source
+        ORDER BY model_name, source
+    '''
+    return [dict(row) for row in conn.execute(query)]
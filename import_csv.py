@@ -1,30 +1,161 @@
-import sqlite3
+"""Import an eval log CSV into the `results` table.
+
+Usage:
+    python import_csv.py [CSV] [--db PATH] [--batch-size N] [--keep-indexes]
+
+The CSV is streamed and inserted in batches, one transaction per batch, so
+files of any size load in constant memory. Progress is recorded in the DB:
+re-running on an unchanged CSV resumes after the last committed batch.
+Rows whose (model_name, doc_internal_id) is already present are skipped,
+which also makes it safe to append a new log into an existing DB.
+
+Unless --keep-indexes is given, the viewer indexes and the search index's
+sync triggers are dropped for the load and rebuilt once at the end, instead
+of being updated row by row.
+"""
+import argparse
 import csv
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+from db import INDEXES, ensure_indexes, index_name
+from leaderboard import refresh_leaderboard
+from search import drop_fts_triggers, has_fts, rebuild_fts
+from storage import is_compact, physical_table, register_functions
+
+DEDUP_COLUMNS = ('model_name', 'doc_internal_id')
+
+INSERT_SQL = '''INSERT INTO results
+    (doc_internal_id, model_name, category, prompt, response, score, explanation)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7
+    WHERE NOT EXISTS (SELECT 1 FROM results WHERE model_name = ?2 AND doc_internal_id = ?1)'''
+
+
+def create_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        doc_id INTEGER,
+        doc_internal_id INTEGER,
+        category TEXT,
+        prompt TEXT,
+        response TEXT,
+        score REAL,
+        explanation TEXT
+    )''')
+    # Needed during the load for the duplicate check; everything else waits.
+    # In a compact DB (see storage.py) indexes go on the store table.
+    table = physical_table(conn, 'results')
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name(table, DEDUP_COLUMNS)} "
+                 f"ON {table} ({', '.join(DEDUP_COLUMNS)})")
+    conn.execute('''CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        rows_done INTEGER
+    )''')
+    conn.commit()
+
+
+def drop_viewer_indexes(conn):
+    table = physical_table(conn, 'results')
+    for cols in INDEXES['results']:
+        if cols != DEDUP_COLUMNS:
+            conn.execute(f"DROP INDEX IF EXISTS {index_name(table, cols)}")
+    conn.commit()
+
+
+def last_id(conn, table):
+    row = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    return row[0] if row else 0
+
+
+def resume_point(conn, source, st):
+    row = conn.execute('SELECT size, mtime_ns, rows_done FROM import_progress WHERE source = ?', (source,)).fetchone()
+    if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+        return row[2]
+    return 0
+
+
+def parse_row(row):
+    return (int(row['prompt_id'].replace("p", "")), row['model_name'], row['category'], row['prompt'],
+            row['model_response'], float(row['score']), row['explanation'])
+
+
+def import_csv(csv_path, db_path, batch_size=5000, keep_indexes=False):
+    source = os.path.abspath(csv_path)
+    st = os.stat(csv_path)
+
+    conn = register_functions(sqlite3.connect(db_path))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    create_schema(conn)
+    if not keep_indexes:
+        drop_viewer_indexes(conn)
+        drop_fts_triggers(conn, 'results')
+
+    skip = resume_point(conn, source, st)
+    if skip:
+        print(f"Resuming after {skip} rows already imported from {csv_path}")
+
+    # Inserts through a compact DB's view (see storage.py) report no rowcount
+    store = physical_table(conn, 'results') if is_compact(conn, 'results') else None
+    models = set()
+    read = inserted = 0
+    start = time.perf_counter()
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for _ in islice(reader, skip):
+            pass
+        done = skip
+        while True:
+            batch = [parse_row(row) for row in islice(reader, batch_size)]
+            if not batch:
+                break
+            before = store and last_id(conn, store)
+            cur = conn.executemany(INSERT_SQL, batch)
+            inserted += last_id(conn, store) - before if store else cur.rowcount
+            read += len(batch)
+            done += len(batch)
+            models.update(row[1] for row in batch)
+            conn.execute('INSERT OR REPLACE INTO import_progress VALUES (?, ?, ?, ?)',
+                         (source, st.st_size, st.st_mtime_ns, done))
+            conn.commit()
+            elapsed = time.perf_counter() - start
+            print(f"  {done} rows ({read / elapsed:,.0f} rows/s)", end='\r', flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"\nRead {read} rows in {elapsed:.1f}s ({read / max(elapsed, 1e-9):,.0f} rows/s): "
+          f"{inserted} inserted, {read - inserted} duplicates skipped")
+
+    # Back to a single-file, crash-safe DB the read-only viewer can open as is
+    conn.execute('PRAGMA synchronous = FULL')
+    conn.execute('PRAGMA journal_mode = DELETE')
+    print('Building indexes...')
+    ensure_indexes(conn)
+    if not keep_indexes and has_fts(conn, 'results'):
+        print('Rebuilding search index...')
+        rebuild_fts(conn, 'results')
+    if inserted:
+        refresh_leaderboard(conn, models)
+    conn.close()
+    return inserted
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('csv', nargs='?', default='test-log.csv', help='CSV log to import')
+    ap.add_argument('--db', type=str, default='new_results.db', help='Path to DB file (created if missing)')
+    ap.add_argument('--batch-size', type=int, default=5000, help='Rows per transaction')
+    ap.add_argument('--keep-indexes', action='store_true',
+                    help='Maintain the viewer and search indexes row by row instead of rebuilding them after the load')
+    args = ap.parse_args()
 
-conn = sqlite3.connect('new_results.db')
-cursor = conn.cursor()
-
-cursor.execute('''CREATE TABLE results (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    model_name TEXT,
-    doc_id INTEGER,
-    doc_internal_id INTEGER,
-    category TEXT,
-    prompt TEXT,
-    response TEXT,
-    score REAL,
-    explanation TEXT
-)''')
-
-with open('test-log.csv', 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        cursor.execute('''INSERT INTO results 
-            (doc_internal_id, model_name, category, prompt, response, score, explanation)
-            VALUES (?, ?, ?, ?, ?, ?, ?)''',
-            (int(row['prompt_id'].replace("p", "")), row['model_name'], row['category'], row['prompt'], 
-             row['model_response'], float(row['score']), row['explanation']))
-
-conn.commit()
-conn.close()
-print("Importação concluída!")
+    # Long generations easily exceed the csv module's default 128 KiB field limit
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    import_csv(args.csv, args.db, args.batch_size, args.keep_indexes)
+    print("Importação concluída!")
@@ -0,0 +1,179 @@
+"""Precomputed per-model / per-category score summary.
+
+Each DB gets a `leaderboard` table with one row per (model, category) plus
+an overall row per model (category ''), so the leaderboard page is a single
+indexed read. Import tools refresh only the models they touch;
+`ensure_leaderboard` rebuilds it when the source table changed behind their
+back, or when it was built by a version of `summarize` that binned or
+summarized differently (see SUMMARY_VERSION).
+"""
+import json
+import math
+
+from queries import bin_width
+from storage import physical_table
+
+# (table, column the summary is broken down by, label shown in the UI)
+SOURCES = (
+    ('results', 'category', 'Category'),
+    ('evaluations', 'group_name', 'Group'),
+    ('evaluations', 'used_pt_pt_prompt', 'PT-PT Prompt'),
+)
+
+# Bump when `summarize` changes what it stores (e.g. its histogram bins),
+# so stored leaderboards are rebuilt even though their source is unchanged
+SUMMARY_VERSION = 2
+
+
+def summary_source(conn):
+    """Return the (table, group column, label) entry that fits this DB, or None."""
+    for table, group_column, label in SOURCES:
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if {'model_name', 'score', group_column} <= columns:
+            return table, group_column, label
+    return None
+
+
+def summarize(conn, models=None):
+    """Compute leaderboard rows for `models` (all models when None).
+
+    Returns a list of dicts with model_name, category, n, mean, median,
+    stddev and histogram ([bin start, count] pairs).
+    """
+    source = summary_source(conn)
+    if source is None:
+        return []
+    table, group_column, _ = source
+    where, params = 'WHERE score IS NOT NULL', []
+    if models is not None:
+        where += f" AND model_name IN ({', '.join('?' * len(models))})"
+        params = list(models)
+    # The same bins as the list pages' score histograms
+    width = bin_width(conn, table)
+
+    rows = {}
+    for group_expr in (f"COALESCE(CAST({group_column} AS TEXT), '')", "''"):
+        query = f'''
+            SELECT model_name, grp, COUNT(*), AVG(score), AVG(score * score),
+                   MAX(CASE WHEN rn = n / 2 + 1 THEN score END)
+            FROM (
+                SELECT model_name, {group_expr} AS grp, score,
+                       ROW_NUMBER() OVER (PARTITION BY model_name, {group_expr} ORDER BY score) AS rn,
+                       COUNT(*) OVER (PARTITION BY model_name, {group_expr}) AS n
+                FROM {table} {where}
+            )
+            GROUP BY model_name, grp
+        '''
+        for model, grp, n, mean, mean_sq, median in conn.execute(query, params):
+            rows[(model, grp)] = {
+                'model_name': model,
+                'category': grp,
+                'n': n,
+                'mean': mean,
+                'median': median,
+                'stddev': math.sqrt(max(mean_sq - mean * mean, 0)),
+                'histogram': [],
+            }
+        hist_query = f'''
+            SELECT model_name, {group_expr}, CAST(score / {width} AS INTEGER) * {width} AS bin, COUNT(*)
+            FROM {table} {where}
+            GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+        '''
+        for model, grp, bin_start, count in conn.execute(hist_query, params):
+            rows[(model, grp)]['histogram'].append([bin_start, count])
+    return list(rows.values())
+
+
+def score_distributions(conn):
+    """Return {(model_name, category): (distinct scores, counts)}, category '' being the model overall."""
+    source = summary_source(conn)
+    if source is None:
+        return {}
+    table, group_column, _ = source
+    query = f'''
+        SELECT model_name, COALESCE(CAST({group_column} AS TEXT), ''), score, COUNT(*)
+        FROM {table} WHERE score IS NOT NULL
+        GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+    '''
+    distributions = {}
+    for model, grp, score, count in conn.execute(query):
+        for key in ((model, grp), (model, '')):
+            values, counts = distributions.setdefault(key, ([], []))
+            values.append(score)
+            counts.append(count)
+    return distributions
+
+
+def _source_state(conn, table):
+    # On the rows' physical table: a compact DB's `results` view has no rowid (see storage.py)
+    table = physical_table(conn, table)
+    return [SUMMARY_VERSION, *conn.execute(f'SELECT COUNT(*), MAX(rowid) FROM {table}').fetchone()]
+
+
+def _stored_state(conn):
+    """The source state the stored leaderboard was built from, or None if there is none."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'leaderboard_state'").fetchone():
+        return None
+    # Tables from before SUMMARY_VERSION have no version column and never match
+    state = conn.execute('SELECT * FROM leaderboard_state').fetchone()
+    return list(state) if state is not None else None
+
+
+def refresh_leaderboard(conn, models=None):
+    """Rebuild the leaderboard rows of `models` (every model when None)."""
+    source = summary_source(conn)
+    if source is None:
+        return 0
+    stored = _stored_state(conn)
+    current = stored is not None and len(stored) == 3 and stored[0] == SUMMARY_VERSION
+    if not current or not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'leaderboard'").fetchone():
+        models = None  # nothing to update incrementally yet, or every row is out of date
+    conn.execute('''CREATE TABLE IF NOT EXISTS leaderboard (
+        model_name TEXT,
+        category TEXT,
+        n INTEGER,
+        mean REAL,
+        median REAL,
+        stddev REAL,
+        histogram TEXT,
+        PRIMARY KEY (model_name, category)
+    )''')
+    if stored is not None and len(stored) != 3:
+        conn.execute('DROP TABLE leaderboard_state')
+    conn.execute('CREATE TABLE IF NOT EXISTS leaderboard_state (version INTEGER, row_count INTEGER, '
+                 'max_rowid INTEGER)')
+    if models is None:
+        conn.execute('DELETE FROM leaderboard')
+    else:
+        models = list(models)
+        conn.execute(f"DELETE FROM leaderboard WHERE model_name IN ({', '.join('?' * len(models))})", models)
+    rows = summarize(conn, models)
+    conn.executemany(
+        'INSERT INTO leaderboard (model_name, category, n, mean, median, stddev, histogram) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(r['model_name'], r['category'], r['n'], r['mean'], r['median'], r['stddev'], json.dumps(r['histogram']))
+         for r in rows])
+    conn.execute('DELETE FROM leaderboard_state')
+    conn.execute('INSERT INTO leaderboard_state VALUES (?, ?, ?)', _source_state(conn, source[0]))
+    conn.commit()
+    return len(rows)
+
+
+def ensure_leaderboard(conn):
+    """Build the leaderboard if it is missing or out of date with its source table."""
+    source = summary_source(conn)
+    if source is None:
+        return False
+    if _stored_state(conn) == _source_state(conn, source[0]):
+        return False
+    refresh_leaderboard(conn)
+    return True
+
+
+def load_leaderboard(conn):
+    """Read the stored leaderboard, computing it on the fly if the DB has none."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'leaderboard'").fetchone():
+        rows = [dict(row) for row in conn.execute('SELECT * FROM leaderboard')]
+        for row in rows:
+            row['histogram'] = json.loads(row['histogram'])
+        return rows
+    return summarize(conn)
@@ -1,301 +1,250 @@
-from flask import Flask, render_template, request
-import sqlite3
+from flask import Flask, abort, g, render_template, request, url_for
+from jinja2 import pass_context
+import logging
 import os
 
+import api
+import db
+import profiling
+from aliases import alias_cache, model_aliases
+from cache import LRUCache, cached_response, db_cached, response_cache
+from compare import item_key, paired_scores, summarize_pairs
+from db import get_db, provision, request_db_name, served_db
+from federation import federation, model_scores
+from leaderboard import load_leaderboard, score_distributions, summary_source
+from search import highlight
+from significance import bootstrap_ci
+from streaming import FLUSH, stream_page
+from threads import THREADS_PER_PAGE, fetch_threads
+from views import (column_options, conversation_options, detect_spec, facet_cache, interval_cache, is_on,
+                   list_columns, list_context, page_arg, panel_cache, table_info)
+
 app = Flask(__name__)
+db.init_app(app)
+profiling.init_app(app, response_cache)
+app.register_blueprint(api.bp)
+app.add_template_filter(highlight)
+app.add_template_global(api.pq is not None, 'parquet_export')
+app.add_template_global(FLUSH, 'flush')
 
-def get_db():
-    db_name = request.args.get('db', 'new_results.db')
-    if not os.path.exists(db_name):
-        db_name = 'new_results.db'
-    conn = sqlite3.connect(db_name)
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.template_global()
+def export_url(db_name, output):
+    """Streamed export of every row matching the current page's filters."""
+    args = {k: v for k, v in request.args.items() if k not in ('page', 'after', 'before', 'db')}
+    return url_for('api.results', **args, db=db_name, format=output)
 
-@app.route('/')
-def index():
-    selected_db = request.args.get('db', 'new_results.db')
-    
-    # Route to evaluations view if evaluations.db is selected
-    if selected_db == 'evaluations.db':
-        return evaluations()
-    
-    # Route to conversations view if pt_pt_conversation_evaluations.db is selected
-    if selected_db == 'pt_pt_conversation_evaluations.db':
-        return conversations()
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get filter options
-    models = cursor.execute('SELECT DISTINCT model_name FROM results ORDER BY model_name').fetchall()
-    categories = cursor.execute('SELECT DISTINCT category FROM results ORDER BY category').fetchall()
-    
-    # Get filter parameters
-    selected_model = request.args.get('model', '')
-    selected_category = request.args.get('category', '')
-    min_score = request.args.get('min_score', '')
-    max_score = request.args.get('max_score', '')
-    page = int(request.args.get('page', 1))
-    
-    # Get available databases
+@app.template_filter()
+@pass_context
+def display_name(context, model_name):
+    """`model_name` as the rendered page's DB aliases it (see aliases.py)."""
+    db_name = context.get('selected_db')
+    if not db_name:
+        return model_name
+    aliases = g.setdefault('model_aliases', {})
+    if db_name not in aliases:
+        aliases[db_name] = model_aliases(get_db(db_name))
+    return aliases[db_name].get(model_name, model_name)
+
+TEXT_LABELS = {
+    'prompt': 'Prompt',
+    'question': 'Question',
+    'context': 'Conversation Context',
+    'response': 'Response',
+    'answer': 'Answer',
+    'explanation': 'Explanation',
+    'reasoning': 'Reasoning',
+    'raw_output': 'Raw Output',
+}
+
+def list_page(db_name):
+    """Render the list view that fits `db_name`'s schema (see views.SPECS)."""
+    conn = get_db(db_name)
+    spec = detect_spec(conn)
+    if spec is None:
+        abort(404)
     dbs = [f for f in os.listdir('.') if f.endswith('.db')]
-    
-    # Build query
-    query = 'SELECT * FROM results WHERE 1=1'
-    params = []
-    
-    if selected_model:
-        query += ' AND model_name = ?'
-        params.append(selected_model)
-    if selected_category:
-        query += ' AND category = ?'
-        params.append(selected_category)
-    if min_score:
-        query += ' AND score >= ?'
-        params.append(float(min_score))
-    if max_score:
-        query += ' AND score <= ?'
-        params.append(float(max_score))
-    
-    # Get total count and stats
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*)')
-    total_count = cursor.execute(count_query, params).fetchone()[0]
-    
-    stats_query = query.replace('SELECT *', 'SELECT AVG(score), MIN(score), MAX(score)')
-    stats = cursor.execute(stats_query, params).fetchone()
-    avg_score = round(stats[0], 2) if stats[0] else 0
-    min_score_val = stats[1] if stats[1] else 0
-    max_score_val = stats[2] if stats[2] else 0
-    
-    # Get median
-    median_query = query.replace('SELECT *', 'SELECT score') + ' ORDER BY score'
-    all_scores = [row[0] for row in cursor.execute(median_query, params).fetchall()]
-    median_score = all_scores[len(all_scores)//2] if all_scores else 0
-    
-    # Pagination
-    per_page = 50
-    offset = (page - 1) * per_page
-    total_pages = (total_count + per_page - 1) // per_page
-    
-    query += f' ORDER BY id DESC LIMIT {per_page} OFFSET {offset}'
-    
-    results = cursor.execute(query, params).fetchall()
-    conn.close()
-    
-    return render_template('index.html', 
-                         results=results, 
-                         total_count=total_count,
-                         page=page,
-                         total_pages=total_pages,
-                         models=models, 
-                         categories=categories,
+    return stream_page(spec.template,
                          dbs=dbs,
-                         selected_db=selected_db,
-                         selected_model=selected_model,
-                         selected_category=selected_category,
-                         min_score=min_score,
-                         max_score=max_score,
-                         avg_score=avg_score,
-                         median_score=median_score,
-                         min_score_val=min_score_val,
-                         max_score_val=max_score_val)
+                         selected_db=db_name,
+                         **list_context(conn, spec, request.args))
 
+@app.route('/')
+@cached_response()
+def index():
+    return list_page(request_db_name())
+
+# Old per-DB addresses, kept working for bookmarks
 @app.route('/evaluations')
+@cached_response('evaluations.db')
 def evaluations():
-    conn = sqlite3.connect('evaluations.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Get filter options
-    models = cursor.execute('SELECT DISTINCT model_name FROM evaluations ORDER BY model_name').fetchall()
-    groups = cursor.execute('SELECT DISTINCT group_name FROM evaluations ORDER BY group_name').fetchall()
-    
-    # Get filter parameters
-    selected_db = 'evaluations.db'
-    selected_model = request.args.get('model', '')
-    selected_group = request.args.get('group', '')
-    min_score = request.args.get('min_score', '')
-    max_score = request.args.get('max_score', '')
-    page = int(request.args.get('page', 1))
-    
+    return list_page('evaluations.db')
+
+@app.route('/conversations')
+@cached_response('pt_pt_conversation_evaluations.db')
+def conversations():
+    return list_page('pt_pt_conversation_evaluations.db')
+
+@app.route('/threads')
+@cached_response(lambda: request_db_name('pt_pt_conversation_evaluations.db'))
+def threads():
+    """Conversations one thread at a time, each turn's responses side by side per model."""
+    db_name = request_db_name('pt_pt_conversation_evaluations.db')
+    conn = get_db(db_name)
+    spec = detect_spec(conn)
+    if spec is None or spec.name != 'conversations':
+        abort(404)
     dbs = [f for f in os.listdir('.') if f.endswith('.db')]
-    
-    # Build query
-    query = 'SELECT * FROM evaluations WHERE 1=1'
-    params = []
-    
-    if selected_model:
-        query += ' AND model_name = ?'
-        params.append(selected_model)
-    if selected_group:
-        query += ' AND group_name = ?'
-        params.append(selected_group)
-    if min_score:
-        query += ' AND score >= ?'
-        params.append(float(min_score))
-    if max_score:
-        query += ' AND score <= ?'
-        params.append(float(max_score))
-    
-    # Get total count and stats
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*)')
-    total_count = cursor.execute(count_query, params).fetchone()[0]
-    
-    stats_query = query.replace('SELECT *', 'SELECT AVG(score), MIN(score), MAX(score)')
-    stats = cursor.execute(stats_query, params).fetchone()
-    avg_score = round(stats[0], 2) if stats[0] else 0
-    min_score_val = stats[1] if stats[1] else 0
-    max_score_val = stats[2] if stats[2] else 0
-    
-    # Get median
-    median_query = query.replace('SELECT *', 'SELECT score') + ' ORDER BY score'
-    all_scores = [row[0] for row in cursor.execute(median_query, params).fetchall()]
-    median_score = all_scores[len(all_scores)//2] if all_scores else 0
-    
-    # Pagination
-    per_page = 50
-    offset = (page - 1) * per_page
-    total_pages = (total_count + per_page - 1) // per_page
-    
-    query += f' ORDER BY id DESC LIMIT {per_page} OFFSET {offset}'
-    
-    results = cursor.execute(query, params).fetchall()
-    conn.close()
-    
-    return render_template('evaluations.html',
-                         results=results,
-                         total_count=total_count,
+    columns = {name for name, _ in table_info(conn, spec.table)}
+    page = page_arg(request.args)
+
+    try:
+        thread_list, models, total = fetch_threads(conn.cursor(), spec.table, columns, request.args,
+                                                   list_columns(conn, spec, 'e.', exclude=('raw_output',)), page)
+    except ValueError as e:
+        abort(400, f'Invalid filter value: {e}')
+    total_pages = (total + THREADS_PER_PAGE - 1) // THREADS_PER_PAGE
+    args = dict(request.args.lists())
+
+    return stream_page('threads.html',
+                         dbs=dbs,
+                         selected_db=db_name,
+                         threads=thread_list,
+                         models=models,
+                         all_models=column_options('model_name')(conn, spec.table),
+                         conversations_list=conversation_options(conn, spec.table),
+                         selected_models=request.args.getlist('model'),
+                         selected_conversation=request.args.get('conversation', ''),
+                         selected_pt_pt_prompt=request.args.get('pt_pt_prompt', ''),
+                         total_count=total,
                          page=page,
                          total_pages=total_pages,
-                         models=models,
-                         groups=groups,
-                         dbs=dbs,
-                         selected_db=selected_db,
-                         selected_model=selected_model,
-                         selected_group=selected_group,
-                         min_score=min_score,
-                         max_score=max_score,
-                         avg_score=avg_score,
-                         median_score=median_score,
-                         min_score_val=min_score_val,
-                         max_score_val=max_score_val)
+                         prev_url=url_for('threads', **dict(args, page=page - 1)),
+                         next_url=url_for('threads', **dict(args, page=page + 1)))
 
-@app.route('/conversations')
-def conversations():
-    conn = sqlite3.connect('pt_pt_conversation_evaluations.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Get filter options
-    models = cursor.execute('SELECT DISTINCT model_name FROM evaluations ORDER BY model_name').fetchall()
-    models = [dict(row) for row in models]
-    conversations_list = cursor.execute('SELECT DISTINCT conversation_id FROM evaluations ORDER BY conversation_id').fetchall()
-    conversations_list = [dict(row) for row in conversations_list]
-    for conversation in conversations_list:
-        conversation['conversation_id'] = int(conversation['conversation_id'].replace('p', '').replace('t', ' '))
-    conversations_list.sort(key=lambda x: x['conversation_id'])
-    # Delete duplicates
-    seen = set()
-    unique_conversations = []
-    for conv in conversations_list:
-        if conv['conversation_id'] not in seen:
-            unique_conversations.append(conv)
-            seen.add(conv['conversation_id'])
-    conversations_list = unique_conversations
-    # Tranform the number in string format
-    for conversation in conversations_list:
-        conversation['conversation_id'] = f"{conversation['conversation_id']}"
+@app.route('/row/<db_name>/<int:row_id>')
+@cached_response(lambda db_name, row_id: db_name)
+def row(db_name, row_id):
+    """Full text of one row, fetched when a card on a list page is expanded."""
+    if not served_db(db_name):
+        abort(404)
+    conn = get_db(db_name)
+    spec = detect_spec(conn)
+    if spec is None:
+        abort(404)
+    columns = [name for name, _ in table_info(conn, spec.table) if name in spec.text_columns]
+    hidden = [column for arg, column in spec.toggles.items() if not is_on(request.args.get(arg, ''))]
+    columns = [col for col in columns if col not in hidden]
+    if not columns:
+        abort(404)
+    id_column = spec.key[-1][0]
+    result = conn.execute(f"SELECT {', '.join(columns)} FROM {spec.table} WHERE {id_column} = ?",
+                          (row_id,)).fetchone()
+    if result is None:
+        abort(404)
+    order = [col for col in TEXT_LABELS if col in columns] + [col for col in columns if col not in TEXT_LABELS]
+    fields = [(TEXT_LABELS.get(col, col.replace('_', ' ').title()), col, result[col]) for col in order if result[col]]
+    return render_template('row.html', fields=fields)
 
+# Paired (a, b) comparisons, reused across pages and re-sorts of the same pair
+compare_cache = LRUCache(maxsize=32)
 
-    # Get filter parameters
-    selected_db = 'pt_pt_conversation_evaluations.db'
-    selected_model = request.args.get('model', '')
-    selected_conversation = request.args.get('conversation', '')
-    selected_pt_pt = request.args.get('pt_pt_prompt', '')
-    # show_raw checkbox (off by default)
-    selected_show_raw = request.args.get('show_raw', '')
-    show_raw = True if str(selected_show_raw).lower() in ('1', 'on', 'true') else False
-    min_score = request.args.get('min_score', '')
-    max_score = request.args.get('max_score', '')
-    page = int(request.args.get('page', 1))
-    
+for name, lru in (('response', response_cache), ('facet', facet_cache), ('interval', interval_cache),
+                  ('panel', panel_cache), ('compare', compare_cache), ('alias', alias_cache)):
+    profiling.metrics.register_cache(name, lru)
+
+@app.route('/compare')
+@cached_response()
+def compare():
+    conn = get_db()
+    selected_db = conn.db_path
     dbs = [f for f in os.listdir('.') if f.endswith('.db')]
-    
-    # Build query
-    query = 'SELECT * FROM evaluations WHERE 1=1'
-    params = []
-    
-    if selected_model:
-        query += ' AND model_name = ?'
-        params.append(selected_model)
-    if selected_conversation:
-        query += ' AND conversation_id = ?'
-        params.append(f"p{selected_conversation}{"t" if selected_pt_pt else ""}")
-    if selected_pt_pt:
-        query += ' AND used_pt_pt_prompt = ?'
-        params.append(int(selected_pt_pt))
-    if min_score:
-        query += ' AND score >= ?'
-        params.append(float(min_score))
-    if max_score:
-        query += ' AND score <= ?'
-        params.append(float(max_score))
-    
-    # Get total count and stats
-    count_query = query.replace('SELECT *', 'SELECT COUNT(*)')
-    total_count = cursor.execute(count_query, params).fetchone()[0]
-    
-    stats_query = query.replace('SELECT *', 'SELECT AVG(score), MIN(score), MAX(score)')
-    stats = cursor.execute(stats_query, params).fetchone()
-    avg_score = round(stats[0], 2) if stats[0] else 0
-    min_score_val = stats[1] if stats[1] else 0
-    max_score_val = stats[2] if stats[2] else 0
-    
-    # Get median
-    median_query = query.replace('SELECT *', 'SELECT score') + ' ORDER BY score'
-    all_scores = [row[0] for row in cursor.execute(median_query, params).fetchall()]
-    median_score = all_scores[len(all_scores)//2] if all_scores else 0
-    
-    # Pagination
-    per_page = 20
-    offset = (page - 1) * per_page
-    total_pages = (total_count + per_page - 1) // per_page
-    
-    query += f' ORDER BY conversation_id, turn_number LIMIT {per_page} OFFSET {offset}'
-    
-    results = cursor.execute(query, params).fetchall()
-    
-    # Convert results to dict and add readable names
-    results_with_names = []
-    for row in results:
-        row_dict = dict(row)
-        row_dict['readable_model_name'] = row['model_name']
-        row_dict['conversation_id'] = int(row_dict['conversation_id'].replace('p', '').replace('t', ' '))
-        results_with_names.append(row_dict)
-    results_with_names.sort(key=lambda x: (x['conversation_id'], x['turn_number']))
-    
-    conn.close()
-    return render_template('conversations.html',
-                         results=results_with_names,
-                         total_count=total_count,
+    found = item_key(conn)
+    models = column_options('model_name')(conn, found[0]) if found else []
+    source = summary_source(conn)
+    group_label = source[2] if source else 'Category'
+
+    model_a = request.args.get('a', '')
+    model_b = request.args.get('b', '')
+    page = page_arg(request.args)
+    per_page = 100
+
+    pairs, summary = [], []
+    if found and model_a and model_b:
+        pairs = db_cached(compare_cache, conn, ('pairs', model_a, model_b),
+                          lambda: paired_scores(conn, model_a, model_b))
+        summary = db_cached(compare_cache, conn, ('summary', model_a, model_b), lambda: summarize_pairs(pairs))
+    total_pages = max((len(pairs) + per_page - 1) // per_page, 1)
+
+    return render_template('compare.html',
+                         dbs=dbs,
+                         selected_db=selected_db,
+                         group_label=group_label,
+                         models=models,
+                         model_a=model_a,
+                         model_b=model_b,
+                         key=found[1] if found else (),
+                         summary=summary,
+                         pairs=pairs[(page - 1) * per_page:page * per_page],
                          page=page,
-                         total_pages=total_pages,
+                         total_pages=total_pages)
+
+@app.route('/federated')
+def federated():
+    dbs = sorted(f for f in os.listdir('.') if f.endswith('.db'))
+    with federation.connections(dbs) as conns:
+        # Each DB is attached to one connection, so their (model, source) rows never overlap
+        rows = [row for conn in conns
+                for row in db_cached(facet_cache, conn, 'model_scores', lambda: model_scores(conn))]
+    sources = sorted({(row['source'], row['kind']) for row in rows})
+    cells = {(row['model_name'], row['source']): row for row in rows}
+    # Overall: unweighted mean of the model's per-benchmark normalized means
+    overall = {}
+    for row in rows:
+        overall.setdefault(row['model_name'], []).append(row['norm_mean'])
+    overall = {model: sum(means) / len(means) for model, means in overall.items()}
+    models = sorted(overall, key=overall.get, reverse=True)
+
+    return render_template('federated.html',
+                         dbs=dbs,
+                         sources=sources,
                          models=models,
-                         conversations_list=conversations_list,
+                         overall=overall,
+                         cells=cells)
+
+@app.route('/leaderboard')
+@cached_response()
+def leaderboard():
+    conn = get_db()
+    selected_db = conn.db_path
+    dbs = [f for f in os.listdir('.') if f.endswith('.db')]
+    source = summary_source(conn)
+    group_label = source[2] if source else 'Category'
+
+    rows = load_leaderboard(conn)
+    intervals = db_cached(interval_cache, conn, 'leaderboard',
+                          lambda: {key: bootstrap_ci(values, counts)
+                                   for key, (values, counts) in score_distributions(conn).items()})
+    overall = {row['model_name']: row for row in rows if row['category'] == ''}
+    cells = {(row['model_name'], row['category']): row for row in rows if row['category'] != ''}
+    categories = sorted({category for _, category in cells})
+    models = sorted(overall, key=lambda model: overall[model]['mean'], reverse=True)
+
+    return render_template('leaderboard.html',
                          dbs=dbs,
                          selected_db=selected_db,
-                         selected_model=selected_model,
-                         selected_conversation=selected_conversation,
-                         selected_pt_pt=selected_pt_pt,
-                         show_raw=show_raw,
-                         min_score=min_score,
-                         max_score=max_score,
-                         avg_score=avg_score,
-                         median_score=median_score,
-                         min_score_val=min_score_val,
-                         max_score_val=max_score_val)
+                         group_label=group_label,
+                         models=models,
+                         categories=categories,
+                         overall=overall,
+                         cells=cells,
+                         intervals=intervals)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # Provisioning writes to the DBs, so it runs before serving and not at all
+    # when they are declared immutable (run `flask ensure-indexes` first instead)
+    if not db.pool.immutable:
+        for db_name in sorted(f for f in os.listdir('.') if f.endswith('.db')):
+            provision(db_name)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
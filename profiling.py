@@ -0,0 +1,252 @@
+"""Per-request SQL profiling, render timing and Prometheus metrics.
+
+Request latency, per route, is always counted and served at `/metrics` in
+the Prometheus text format, together with the response and LRU cache
+counters. With PROFILE_SQL=1 the pooled and federated connections are
+opened as `ProfilingConnection`s, whose cursors record every statement's
+SQL, parameters, wall time and rows fetched. Statements slower than
+SLOW_QUERY_MS (default 100) get their `EXPLAIN QUERY PLAN` captured and
+logged. Each response then carries a `Server-Timing` header (sql, render,
+total) and HTML pages a debug footer listing the statements.
+
+List pages are rendered whole while profiling (see streaming.py). Streamed
+responses, such as exports, are timed when the stream closes; they get no
+Server-Timing header, and SQL profiling does not cover them.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from flask import (Response, before_render_template, current_app, g, has_request_context, render_template, request,
+                   template_rendered)
+
+import streaming
+from db import PooledConnection, pool
+from federation import federation
+
+ENABLED = os.environ.get('PROFILE_SQL') == '1'
+SLOW_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Upper bounds (seconds) of the request latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _record(conn, sql, params):
+    entry = {'conn': conn, 'sql': sql, 'params': params, 'ms': 0.0, 'rows': 0, 'plan': None}
+    if has_request_context() and 'queries' in g:
+        g.queries.append(entry)
+    return entry
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor that times its statements and counts the rows fetched from them."""
+    _entry = None
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._entry['ms'] += (time.perf_counter() - started) * 1000
+
+    def execute(self, sql, parameters=()):
+        self._entry = _record(self.connection, sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._entry = _record(self.connection, sql, '[many]')
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self._entry['rows'] += row is not None
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(lambda: super(ProfilingCursor, self).fetchmany(*args, **kwargs))
+        self._entry['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._entry['rows'] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self._entry['rows'] += 1
+        return row
+
+
+class ProfilingConnection(PooledConnection):
+    """Pooled connection whose cursors, including those of `execute`, are ProfilingCursors."""
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN details of `sql`, or None if it cannot be explained."""
+    try:
+        # The base class's execute, so the plan itself is not recorded
+        rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    except (sqlite3.Error, ValueError):
+        return None
+    return [row[3] for row in rows]
+
+
+class Metrics:
+    """Per-route request counters and latency histograms."""
+
+    def __init__(self):
+        self.routes = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, seconds, queries, sql_seconds, render_seconds, slow):
+        with self._lock:
+            stats = self.routes.setdefault(route, {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0,
+                                                   'queries': 0, 'sql': 0.0, 'render': 0.0, 'slow': 0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['queries'] += queries
+            stats['sql'] += sql_seconds
+            stats['render'] += render_seconds
+            stats['slow'] += slow
+
+    def register_cache(self, name, cache):
+        """Report `cache`'s (an LRUCache) hit and miss counters."""
+        self.caches[name] = cache
+
+    def render(self, response_cache=None):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{labels} {value}' for labels, value in samples)
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            histogram = []
+            for route, stats in routes:
+                label = _label(route)
+                for bound, count in zip(BUCKETS, stats['buckets']):
+                    histogram.append((f'_bucket{{route="{label}",le="{bound}"}}', count))
+                histogram.append((f'_bucket{{route="{label}",le="+Inf"}}', stats['count']))
+                histogram.append((f'_sum{{route="{label}"}}', round(stats['sum'], 6)))
+                histogram.append((f'_count{{route="{label}"}}', stats['count']))
+            lines.append('# HELP viewer_request_duration_seconds Request latency by route.')
+            lines.append('# TYPE viewer_request_duration_seconds histogram')
+            lines.extend(f'viewer_request_duration_seconds{suffix} {value}' for suffix, value in histogram)
+            for key, name, help_text in (
+                    ('queries', 'viewer_sql_queries_total', 'SQL statements run (PROFILE_SQL=1 only).'),
+                    ('sql', 'viewer_sql_duration_seconds_total', 'Time spent in SQLite (PROFILE_SQL=1 only).'),
+                    ('render', 'viewer_render_duration_seconds_total', 'Time spent rendering templates.'),
+                    ('slow', 'viewer_slow_queries_total', f'Statements slower than {SLOW_MS:g} ms.')):
+                metric(name, 'counter', help_text,
+                       [(f'{{route="{_label(route)}"}}', round(stats[key], 6)) for route, stats in routes])
+
+        caches = sorted(self.caches.items())
+        metric('viewer_cache_hits_total', 'counter', 'LRU cache hits.',
+               [(f'{{cache="{name}"}}', cache.hits) for name, cache in caches])
+        metric('viewer_cache_misses_total', 'counter', 'LRU cache misses.',
+               [(f'{{cache="{name}"}}', cache.misses) for name, cache in caches])
+        metric('viewer_cache_entries', 'gauge', 'LRU cache entries.',
+               [(f'{{cache="{name}"}}', len(cache)) for name, cache in caches])
+        if response_cache is not None:
+            stats = response_cache.stats()
+            metric('viewer_response_cache_bytes', 'gauge', 'Bytes of rendered responses cached in memory.',
+                   [('', stats['bytes'])])
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.render_seconds = 0.0
+    if ENABLED:
+        g.queries = []
+
+
+def _start_render(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def _end_render(sender, template, context, **extra):
+    if 'render_started' in g:
+        g.render_seconds += time.perf_counter() - g.pop('render_started')
+
+
+def _observe(route, state):
+    # `state` is the request's `g`, which outlives the request context of a streamed response
+    total = time.perf_counter() - state.request_started
+    queries = state.get('queries', [])
+    slow = [entry for entry in queries if entry['ms'] >= SLOW_MS]
+    sql_seconds = sum(entry['ms'] for entry in queries) / 1000
+    metrics.observe(route, total, len(queries), sql_seconds, state.render_seconds, len(slow))
+    return total, queries, slow, sql_seconds
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if response.is_streamed:
+        # Streamed pages render while they are sent: count them once the stream is done
+        state = g._get_current_object()
+        response.call_on_close(lambda: _observe(route, state))
+        return response
+    total, queries, slow, sql_seconds = _observe(route, g)
+    if not ENABLED:
+        return response
+
+    for entry in slow:
+        if entry['params'] != '[many]':
+            entry['plan'] = explain(entry['conn'], entry['sql'], entry['params'])
+        current_app.logger.warning('Slow query on %s (%.1f ms, %d rows): %s\n  plan: %s', route, entry['ms'],
+                                   entry['rows'], ' '.join(entry['sql'].split()), entry['plan'])
+    response.headers['Server-Timing'] = (f'sql;dur={sql_seconds * 1000:.1f};desc="{len(queries)} queries", '
+                                         f'render;dur={g.render_seconds * 1000:.1f}, total;dur={total * 1000:.1f}')
+    if (response.mimetype == 'text/html' and response.status_code == 200
+            and 'Content-Encoding' not in response.headers):
+        footer = render_template('profile.html', queries=queries, slow_ms=SLOW_MS, total_ms=total * 1000,
+                                 sql_ms=sql_seconds * 1000, render_ms=g.render_seconds * 1000)
+        body = response.get_data(as_text=True)
+        at = body.rfind('</body>')
+        response.set_data(body[:at] + footer + body[at:] if at >= 0 else body + footer)
+    return response
+
+
+def init_app(app, response_cache=None):
+    """Time every request and serve `/metrics`; with PROFILE_SQL=1 also profile SQL."""
+    if ENABLED:
+        pool.factory = ProfilingConnection
+        federation.factory = ProfilingConnection
+        # The footer is added to the whole page
+        streaming.ENABLED = False
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_end_render, app)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(response_cache), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,182 @@
+"""Shared query helpers for the viewer routes.
+
+Each view builds a `WHERE` clause plus its parameter list; the helpers here
+turn that into the statements the pages need.
+"""
+from search import TEXT_COLUMNS
+
+# Characters of each long text column shown on list pages; the rest is
+# fetched per row when a card is expanded.
+PREVIEW_CHARS = 400
+
+# Percentiles reported next to the median, as (name, percent) pairs.
+PERCENTILES = (('p10', 10), ('median', 50), ('p90', 90))
+
+
+def score_stats(cursor, table, where, params):
+    """Return count, average, min, max, median and p10/p90 of `score`.
+
+    Everything is computed by a single statement: the filtered rows are
+    numbered in score order once, and each percentile is picked by its rank
+    instead of pulling every score into Python. NULL scores sort first, so
+    ranks are offset past them; they still count towards `total_count`.
+    """
+    picks = ',\n'.join(
+        f'MAX(CASE WHEN rn = n - scored + scored * {pct} / 100 + 1 THEN score END)'
+        for _, pct in PERCENTILES
+    )
+    query = f'''
+        SELECT MAX(n), AVG(score), MIN(score), MAX(score),
+        {picks}
+        FROM (
+            SELECT score,
+                   ROW_NUMBER() OVER (ORDER BY score) AS rn,
+                   COUNT(*) OVER () AS n,
+                   COUNT(score) OVER () AS scored
+            FROM {table}{where}
+        )
+    '''
+    row = cursor.execute(query, params).fetchone()
+    stats = {
+        'total_count': row[0] or 0,
+        'avg_score': round(row[1], 2) if row[1] else 0,
+        'min_score_val': row[2] if row[2] else 0,
+        'max_score_val': row[3] if row[3] else 0,
+    }
+    for (name, _), value in zip(PERCENTILES, row[4:]):
+        stats[f'{name}_score'] = value if value else 0
+    return stats
+
+
+# Sort keys of the list views as (column, type) pairs. The conversations
+# key ends with `id` so that every row has a unique position to seek to.
+ID_KEY = (('id', int),)
+CONVERSATION_KEY = (('conversation_id', str), ('turn_number', int), ('id', int))
+CONVERSATION_NUM_KEY = (('conversation_num', int), ('used_pt_pt_prompt', int), ('turn_number', int), ('id', int))
+
+
+def bin_width(cursor, table):
+    """Histogram bin width for `table`'s score scale.
+
+    1-5 scales get half-point bins when any score is fractional and one bin
+    per point otherwise, 0-10 scales one bin per point, larger scales one
+    per 10 points.
+    """
+    top, fractional = cursor.execute(f'SELECT MAX(score), MAX(score != CAST(score AS INTEGER)) '
+                                     f'FROM {table}').fetchone()
+    top = top or 0
+    if top <= 5:
+        return 0.5 if fractional else 1
+    return 1 if top <= 10 else 10
+
+
+def score_buckets(cursor, table, where, params, width, model=None, group=None):
+    """Count and sum of the filtered non-NULL scores per (model, group, bin).
+
+    One GROUP BY over the filtered rows; histograms and per-cell means are
+    summed from its (small) result. `model` and `group` name the columns to
+    break down by; without one, that part of every row is ''.
+    """
+    model, group = (f"COALESCE(CAST({col} AS TEXT), '')" if col else "''" for col in (model, group))
+    query = f'''
+        SELECT {model}, {group}, CAST(score / {width} AS INTEGER) * {width} AS bin, COUNT(*), SUM(score)
+        FROM {table}{where} AND score IS NOT NULL
+        GROUP BY 1, 2, 3
+    '''
+    return cursor.execute(query, params).fetchall()
+
+
+def encode_cursor(row, key):
+    return ':'.join(str(row[col]) for col, _ in key)
+
+
+def decode_cursor(value, key):
+    # Only the leading column may be a free-form string, so split from the right.
+    parts = value.rsplit(':', len(key) - 1)
+    if len(parts) != len(key):
+        raise ValueError(f'Malformed page cursor: {value!r}')
+    return [convert(part) for (_, convert), part in zip(key, parts)]
+
+
+def preview_columns(columns, prefix='', chars=PREVIEW_CHARS, long_columns=TEXT_COLUMNS):
+    """Select list for list pages: long text columns cut to `chars` characters.
+
+    Other columns are selected as is. Cut values end with '…', and a
+    `truncated` flag tells whether any column of the row was cut.
+    """
+    select, long = [], []
+    for col in columns:
+        if col in long_columns:
+            long.append(f'length({prefix}{col}) > {chars}')
+            select.append(f"CASE WHEN length({prefix}{col}) > {chars} "
+                          f"THEN substr({prefix}{col}, 1, {chars}) || '…' ELSE {prefix}{col} END AS {col}")
+        else:
+            select.append(f'{prefix}{col}')
+    select.append(f"({' OR '.join(long) or '0'}) AS truncated")
+    return ', '.join(select)
+
+
+def fetch_page(cursor, table, where, params, key, descending, per_page, page, after='', before='', select='*'):
+    """Fetch one page of rows ordered by `key`.
+
+    With an `after`/`before` cursor (the sort key of the last/first row of
+    the neighbouring page) the query seeks straight to it, so deep pages cost
+    the same as the first one. Without one, or with a malformed one, it falls
+    back to `LIMIT/OFFSET` on the page number.
+
+    `select` replaces the default `*` (see `preview_columns`).
+
+    Returns `(rows, prev_cursor, next_cursor)`.
+    """
+    columns = ', '.join(col for col, _ in key)
+    backwards = False
+    limit = f'LIMIT {per_page} OFFSET {(page - 1) * per_page}'
+    try:
+        values = decode_cursor(after or before, key) if (after or before) else None
+    except ValueError:
+        values = None
+    if values is not None:
+        backwards = not after
+        op = '>' if descending == backwards else '<'
+        where += f" AND ({columns}) {op} ({', '.join('?' * len(key))})"
+        params = list(params) + values
+        limit = f'LIMIT {per_page}'
+    direction = 'ASC' if descending == backwards else 'DESC'
+    order = ', '.join(f'{col} {direction}' for col, _ in key)
+    rows = cursor.execute(f'SELECT {select} FROM {table}{where} ORDER BY {order} {limit}', params).fetchall()
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, '', ''
+    return rows, encode_cursor(rows[0], key), encode_cursor(rows[-1], key)
+
+
+def _score_range(args, where, params):
+    if args.get('min_score', ''):
+        where += ' AND score >= ?'
+        params.append(float(args['min_score']))
+    if args.get('max_score', ''):
+        where += ' AND score <= ?'
+        params.append(float(args['max_score']))
+    return where, params
+
+
+def as_int(value, args):
+    """Filter converter (see views.Filter); here so threads.py can share it without importing views."""
+    return int(value)
+
+
+def build_where(filters, args, score=True):
+    """WHERE clause and params for the `filters` set in `args`.
+
+    `filters` are views.Filter entries; `score` adds the min/max score range.
+    """
+    where = ' WHERE 1=1'
+    params = []
+    for arg, column, convert in filters:
+        if args.get(arg, ''):
+            where += f' AND {column} = ?'
+            params.append(convert(args[arg], args))
+    if score:
+        return _score_range(args, where, params)
+    return where, params
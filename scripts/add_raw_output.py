@@ -6,13 +6,14 @@ Usage:
 Dry-run by default; use --apply to modify DB. Creates DB backup before applying.
 """
 import argparse
-import json
 import shutil
 import sqlite3
-from collections import defaultdict, Counter
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 
+from eval_json import load_eval_dir
+
 ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_DB = ROOT / 'pt_pt_conversation_evaluations.db'
 DEFAULT_EVALS = ROOT / 'pt-pt-eval'
@@ -33,48 +34,35 @@ def find_db(path=None):
     raise FileNotFoundError('No .db file found in repo root')
 
 
-def slug_from_filename(name: str) -> str:
-    import re
-    m = re.match(r"^[^_]+_(.+?)\.json$", name)
-    if not m:
-        return name.rsplit('.', 1)[0]
-    slug = m.group(1)
-    slug = re.sub(r"_+pt-pt$", "", slug)
-    return slug
-
-
-def build_raw_mapping(evals_dir: Path):
-    # mapping: (slug, prompt_id) -> raw_output
-    mapping = {}
-    slug_to_display = {}
-    for p in sorted(evals_dir.glob('*.json')):
-        try:
-            data = json.loads(p.read_text(encoding='utf-8'))
-        except Exception as e:
-            print(f"Skipping {p.name}: can't parse JSON ({e})")
-            continue
-        if not data:
+def stage_raw_outputs(conn, evals_dir: Path, workers=None):
+    """Load the JSON files into temp tables and build `raw_stage`.
+
+    `raw_pairs` holds the first non-empty raw_output per (slug, prompt_id),
+    `slug_display` the most common `model_name` found inside each slug's
+    file. `raw_stage` then lists every (model_name, conversation_id) that
+    should receive a raw_output, under both the slug and the display name.
+    """
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE raw_pairs (slug TEXT, conversation_id TEXT, raw_output TEXT, PRIMARY KEY (slug, conversation_id))")
+    cur.execute("CREATE TEMP TABLE slug_display (slug TEXT PRIMARY KEY, display TEXT)")
+    for name, slug, record in load_eval_dir(evals_dir, workers=workers):
+        if record['error']:
+            print(f"Skipping {name}: can't parse JSON ({record['error']})")
             continue
-        slug = slug_from_filename(p.name)
-        # determine model_name inside if present
-        inside_names = Counter()
-        for obj in data:
-            if isinstance(obj, dict) and 'model_name' in obj:
-                inside_names[obj['model_name']] += 1
-        if inside_names:
-            slug_to_display[slug] = inside_names.most_common(1)[0][0]
-        # collect raw_output per prompt_id
-        for obj in data:
-            if not isinstance(obj, dict):
-                continue
-            prompt_id = obj.get('prompt_id') or obj.get('conversation_id')
-            raw = obj.get('raw_output')
-            if prompt_id and raw:
-                # use first non-empty raw_output
-                key = (slug, prompt_id)
-                if key not in mapping:
-                    mapping[key] = raw
-    return mapping, slug_to_display
+        if record['model_names']:
+            display = Counter(record['model_names']).most_common(1)[0][0]
+            cur.execute("INSERT OR REPLACE INTO slug_display VALUES (?, ?)", (slug, display))
+        # use first non-empty raw_output
+        cur.executemany("INSERT OR IGNORE INTO raw_pairs VALUES (?, ?, ?)",
+                        ((slug, prompt_id, raw) for prompt_id, raw in record['raw_outputs']))
+
+    cur.execute("CREATE TEMP TABLE raw_stage (model_name TEXT, conversation_id TEXT, raw_output TEXT, PRIMARY KEY (model_name, conversation_id))")
+    cur.execute("INSERT OR IGNORE INTO raw_stage SELECT slug, conversation_id, raw_output FROM raw_pairs ORDER BY rowid")
+    cur.execute("""INSERT OR IGNORE INTO raw_stage
+        SELECT d.display, p.conversation_id, p.raw_output
+        FROM raw_pairs p JOIN slug_display d ON d.slug = p.slug
+        ORDER BY p.rowid""")
+    return cur.execute("SELECT COUNT(*) FROM raw_pairs").fetchone()[0]
 
 
 def column_exists(conn, table, column):
@@ -95,6 +83,7 @@ if __name__ == '__main__':
     ap.add_argument('--apply', action='store_true', help='Apply updates to DB (default: dry-run)')
     ap.add_argument('--db', type=str, help='Path to DB file')
     ap.add_argument('--evals-dir', type=str, help='Path to JSON files dir', default=str(DEFAULT_EVALS))
+    ap.add_argument('--workers', type=int, help='Processes used to parse new JSON files (default: CPU count)')
     args = ap.parse_args()
 
     db_path = find_db(args.db)
@@ -105,35 +94,35 @@ if __name__ == '__main__':
     print(f"Using DB: {db_path}")
     print(f"Scanning JSON files in: {evals_dir}")
 
-    mapping, slug_to_display = build_raw_mapping(evals_dir)
-    print(f"Found {len(mapping)} (slug,prompt) raw outputs from JSON files.")
-
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
 
+    n_pairs = stage_raw_outputs(conn, evals_dir, args.workers)
+    print(f"Found {n_pairs} (slug,prompt) raw outputs from JSON files.")
+
     has_column = column_exists(conn, 'evaluations', 'raw_output')
     print('\nDB has raw_output column:', has_column)
 
-    # plan updates: for each (slug,prompt) try to match rows by model_name == slug OR model_name == display_name
-    planned = []  # list of dicts
-    no_match = []
-    total_rows = 0
-    for (slug, prompt), raw in mapping.items():
-        # try slug
-        cur.execute("SELECT COUNT(*) FROM evaluations WHERE model_name = ? AND conversation_id = ?", (slug, prompt))
-        cnt_slug = cur.fetchone()[0]
-        cnt_display = 0
-        display = slug_to_display.get(slug)
-        if display:
-            cur.execute("SELECT COUNT(*) FROM evaluations WHERE model_name = ? AND conversation_id = ?", (display, prompt))
-            cnt_display = cur.fetchone()[0]
-        if cnt_slug + cnt_display == 0:
-            no_match.append((slug, display, prompt))
-            continue
-        planned.append({'slug': slug, 'display': display, 'prompt': prompt, 'raw': raw, 'cnt_slug': cnt_slug, 'cnt_display': cnt_display})
-        total_rows += cnt_slug + cnt_display
-
-    print(f"\nPlanned pairs with matches: {len(planned)} (affects approx {total_rows} rows)")
+    # count the rows each staged pair reaches, via its slug and via its display name
+    cur.execute("""CREATE TEMP TABLE pair_matches AS
+        SELECT pair, slug, conversation_id, SUM(via_slug) AS cnt_slug, SUM(1 - via_slug) AS cnt_display
+        FROM (
+            SELECT p.rowid AS pair, p.slug, p.conversation_id, 1 AS via_slug
+            FROM raw_pairs p
+            JOIN evaluations e ON e.model_name = p.slug AND e.conversation_id = p.conversation_id
+            UNION ALL
+            SELECT p.rowid, p.slug, p.conversation_id, 0
+            FROM raw_pairs p
+            JOIN slug_display d ON d.slug = p.slug AND d.display != p.slug
+            JOIN evaluations e ON e.model_name = d.display AND e.conversation_id = p.conversation_id
+        )
+        GROUP BY pair""")
+    planned, total_rows = cur.execute("SELECT COUNT(*), COALESCE(SUM(cnt_slug + cnt_display), 0) FROM pair_matches").fetchone()
+    no_match = cur.execute("""SELECT p.slug, d.display, p.conversation_id
+        FROM raw_pairs p LEFT JOIN slug_display d ON d.slug = p.slug
+        WHERE p.rowid NOT IN (SELECT pair FROM pair_matches)""").fetchall()
+
+    print(f"\nPlanned pairs with matches: {planned} (affects approx {total_rows} rows)")
     if no_match:
         print(f"Pairs with no matching DB rows: {len(no_match)}")
         if len(no_match) <= 20:
@@ -142,9 +131,10 @@ if __name__ == '__main__':
 
     # show a sample of planned updates
     print('\nSample planned updates (truncated raw_output):')
-    for item in planned[:10]:
-        print(f"  {item['slug']} / {item['prompt']}  -> rows slug:{item['cnt_slug']} display:{item['cnt_display']}")
-        print('    raw (truncated):', repr(item['raw'][:200]))
+    for slug, prompt, cnt_slug, cnt_display, raw in cur.execute("""SELECT m.slug, m.conversation_id, m.cnt_slug, m.cnt_display, substr(p.raw_output, 1, 200)
+            FROM pair_matches m JOIN raw_pairs p ON p.rowid = m.pair ORDER BY m.pair LIMIT 10""").fetchall():
+        print(f"  {slug} / {prompt}  -> rows slug:{cnt_slug} display:{cnt_display}")
+        print('    raw (truncated):', repr(raw))
 
     if not args.apply:
         print('\nDry-run: no changes made. Rerun with --apply to perform changes.')
@@ -160,17 +150,11 @@ if __name__ == '__main__':
         cur.execute("ALTER TABLE evaluations ADD COLUMN raw_output TEXT")
         conn.commit()
 
-    updated_rows = 0
-    for item in planned:
-        raw = item['raw']
-        # update rows where model_name matches slug
-        if item['cnt_slug']:
-            cur.execute("UPDATE evaluations SET raw_output = ? WHERE model_name = ? AND conversation_id = ? AND (raw_output IS NULL OR raw_output = '')", (raw, item['slug'], item['prompt']))
-            updated_rows += cur.rowcount
-        # update rows where model_name matches display (if present)
-        if item['cnt_display'] and item['display']:
-            cur.execute("UPDATE evaluations SET raw_output = ? WHERE model_name = ? AND conversation_id = ? AND (raw_output IS NULL OR raw_output = '')", (raw, item['display'], item['prompt']))
-            updated_rows += cur.rowcount
+    cur.execute("""UPDATE evaluations SET raw_output = s.raw_output
+        FROM raw_stage s
+        WHERE evaluations.model_name = s.model_name AND evaluations.conversation_id = s.conversation_id
+          AND (evaluations.raw_output IS NULL OR evaluations.raw_output = '')""")
+    updated_rows = cur.rowcount
     conn.commit()
 
     print(f"\nApplied updates: {updated_rows} rows updated")
@@ -0,0 +1,238 @@
+"""Load-test the viewer routes against synthetic DBs and report latencies.
+
+Usage:
+    python scripts/benchmark.py [--data DIR] [--rows N] [--repeat N] [--output FILE] [--baseline FILE]
+
+Generates synthetic DBs with scripts/synthetic_dbs.py (unless `--data`
+already has them), provisions them, then requests every route through
+Flask's test client over a mix of filters, searches and deep pages. For
+each scenario it records p50/p95/p99/mean latency, SQL statements per
+request and response size; peak RSS is recorded for the whole run. The
+report is written as JSON; with `--baseline` the run is compared against a
+previous report and scenarios whose p95 got slower than `--tolerance` are
+flagged (and make the script exit 1 with `--fail-on-regression`).
+
+The response cache is off unless `--response-cache` is given, so every
+request reaches SQLite.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from synthetic_dbs import generate_all, model_names
+
+ROOT = Path(__file__).resolve().parents[1]
+DB_FILES = ('new_results.db', 'evaluations.db', 'pt_pt_conversation_evaluations.db')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def count_statements(db, federation):
+    """Count SQL statements run on viewer connections; returns a one-item list holding the count."""
+    counter = [0]
+
+    def trace(statement):
+        # Statements SQLite runs on behalf of another (FTS5 lookups, triggers) start with '--'
+        if not statement.startswith('--'):
+            counter[0] += 1
+
+    def traced(open_connection):
+        def _open(*args):
+            conn = open_connection(*args)
+            conn.set_trace_callback(trace)
+            return conn
+        return _open
+
+    db.pool._open = traced(db.pool._open)
+    federation._open = traced(federation._open)
+    return counter
+
+
+def deep_cursor(client, db_name, page, per_page):
+    """`after` cursor that leads to `page` of the list view (via the JSON API)."""
+    response = client.get(f'/api/results?db={db_name}&per_page={per_page}&page={page - 1}')
+    return response.get_json()['next_cursor']
+
+
+def scenarios(client, models, categories):
+    """(name, url) pairs covering every route over a mix of filters and page depths."""
+    a, b = models[0], models[1 % len(models)]
+    urls = [
+        ('results_list', '/?db=new_results.db'),
+        ('results_model_category', f'/?db=new_results.db&model={a}&category=Category+{categories // 2}'),
+        ('results_score_range', '/?db=new_results.db&min_score=2&max_score=3'),
+        ('results_search', '/?db=new_results.db&q=saudade+fado'),
+        ('evaluations_list', '/?db=evaluations.db'),
+        ('evaluations_group', f'/?db=evaluations.db&model={b}&group=group-1'),
+        ('evaluations_search', '/?db=evaluations.db&q=Coimbra'),
+        ('conversations_list', '/conversations'),
+        ('conversations_filtered', f'/conversations?model={a}&conversation=7&pt_pt_prompt=1'),
+        ('threads', '/threads'),
+        ('threads_two_models', f'/threads?model={a}&model={b}&page=3'),
+        ('leaderboard', '/leaderboard'),
+        ('leaderboard_evaluations', '/leaderboard?db=evaluations.db'),
+        ('compare', f'/compare?a={a}&b={b}'),
+        ('compare_deep', f'/compare?db=evaluations.db&a={a}&b={b}&page=5'),
+        ('federated', '/federated'),
+        ('row', '/row/new_results.db/1'),
+        ('api_results', '/api/results?per_page=100'),
+        ('api_stats', f'/api/stats?model={a}'),
+        ('export_csv', f'/api/results?model={a}&category=Category+0&format=csv'),
+    ]
+    for db_name, per_page in (('new_results.db', 50), ('evaluations.db', 50)):
+        conn = sqlite3.connect(db_name)
+        total = conn.execute('SELECT COUNT(*) FROM ' + ('results' if db_name == 'new_results.db' else 'evaluations'))
+        pages = (total.fetchone()[0] + per_page - 1) // per_page
+        conn.close()
+        deep = max(pages * 9 // 10, 2)
+        stem = db_name.split('.')[0]
+        urls.append((f'{stem}_deep_offset', f'/?db={db_name}&page={deep}'))
+        urls.append((f'{stem}_deep_keyset',
+                     f'/?db={db_name}&page={deep}&after={deep_cursor(client, db_name, deep, per_page)}'))
+    return urls
+
+
+def run(client, counter, urls, repeat, warmup):
+    report = {}
+    for name, url in urls:
+        for _ in range(warmup):
+            client.get(url).get_data()
+        timings, statements, size, status = [], [], 0, None
+        for _ in range(repeat):
+            before = counter[0]
+            started = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+            statements.append(counter[0] - before)
+            size, status = len(body), response.status_code
+            response.close()
+        timings.sort()
+        report[name] = {
+            'url': url,
+            'status': status,
+            'requests': repeat,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries_per_request': round(sum(statements) / len(statements), 2),
+            'bytes': size,
+        }
+        print(f"{name:28} {status}  p50 {report[name]['p50_ms']:9.2f} ms  p95 {report[name]['p95_ms']:9.2f} ms  "
+              f"p99 {report[name]['p99_ms']:9.2f} ms  {report[name]['queries_per_request']:6.1f} queries")
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Print the change against `baseline` per scenario; returns the names that regressed."""
+    regressed = []
+    print(f"\n{'scenario':28} {'p50 before':>11} {'p50 now':>9} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    for name, now in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            print(f'{name:28} (new)')
+            continue
+        change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+        # Sub-millisecond differences are noise
+        flag = change > tolerance and now['p95_ms'] - before['p95_ms'] > 1
+        if flag:
+            regressed.append(name)
+        print(f"{name:28} {before['p50_ms']:11.2f} {now['p50_ms']:9.2f} {before['p95_ms']:11.2f} "
+              f"{now['p95_ms']:9.2f} {change:+8.1%}{'  REGRESSION' if flag else ''}")
+    rss_before = baseline.get('peak_rss_mb')
+    if rss_before:
+        print(f"peak RSS: {rss_before:.1f} MB -> {report['peak_rss_mb']:.1f} MB")
+    return regressed
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--data', type=str, default=str(ROOT / 'bench-data'), help='Directory with the synthetic DBs')
+    ap.add_argument('--regenerate', action='store_true', help='Regenerate the DBs even if they exist')
+    ap.add_argument('--rows', type=int, default=100000, help='Approximate rows per DB when generating')
+    ap.add_argument('--models', type=int, default=8, help='Number of models when generating')
+    ap.add_argument('--categories', type=int, default=12, help='Categories / groups when generating')
+    ap.add_argument('--repeat', type=int, default=20, help='Timed requests per scenario')
+    ap.add_argument('--warmup', type=int, default=1, help='Untimed requests per scenario first')
+    ap.add_argument('--response-cache', action='store_true', help='Leave the response cache on')
+    ap.add_argument('--output', type=str, default='benchmark.json', help='JSON report to write')
+    ap.add_argument('--baseline', type=str, help='Previous JSON report to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.10, help='Allowed p95 slowdown vs the baseline')
+    ap.add_argument('--fail-on-regression', action='store_true', help='Exit 1 if any scenario regressed')
+    args = ap.parse_args()
+
+    output = Path(args.output).resolve()
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    data = Path(args.data)
+    if args.regenerate or not all((data / name).exists() for name in DB_FILES):
+        print(f"Generating {args.rows} rows per DB in {data}")
+        generate_all(data, args.rows, args.models, args.categories)
+
+    # The viewer reads the DBs (and its cache settings) relative to the working directory
+    if not args.response_cache:
+        os.environ['RESPONSE_CACHE_MB'] = '0'
+    os.chdir(data)
+    sys.path.insert(0, str(ROOT))
+    import db
+    from federation import federation
+    from main import app
+
+    provision_times = {}
+    for name in DB_FILES:
+        started = time.perf_counter()
+        db.provision(name)
+        provision_times[name] = round(time.perf_counter() - started, 3)
+
+    counter = count_statements(db, federation)
+    client = app.test_client()
+    conn = sqlite3.connect('new_results.db')
+    models = [row[0] for row in conn.execute('SELECT DISTINCT model_name FROM results ORDER BY model_name')]
+    categories = conn.execute('SELECT COUNT(DISTINCT category) FROM results').fetchone()[0]
+    conn.close()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'data': str(data.resolve()),
+            'db_bytes': {name: os.path.getsize(name) for name in DB_FILES},
+            'models': len(models),
+            'repeat': args.repeat,
+            'response_cache': args.response_cache,
+            'provision_s': provision_times,
+        },
+        'scenarios': run(client, counter, scenarios(client, models or model_names(1), categories),
+                         args.repeat, args.warmup),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\npeak RSS {report['peak_rss_mb']} MB; report written to {output}")
+
+    if baseline:
+        regressed = compare(report, baseline, args.tolerance)
+        if regressed:
+            print(f"{len(regressed)} scenarios slower than the baseline: {', '.join(regressed)}")
+            if args.fail_on_regression:
+                sys.exit(1)
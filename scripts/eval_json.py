@@ -0,0 +1,141 @@
+"""Shared reader for the per-model JSON files in `pt-pt-eval/`.
+
+Files are parsed in a process pool and only the fields the scripts need are
+kept: the `model_name` values found inside, and the first non-empty
+`raw_output` per prompt. Results are cached in `<evals-dir>/.ingest_cache.sqlite`
+keyed by file name, mtime and size, so after adding one new model file only
+that file is parsed again.
+"""
+import json
+import os
+import re
+import sqlite3
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+CACHE_NAME = '.ingest_cache.sqlite'
+
+
+def slug_from_filename(name: str) -> str:
+    # match prefix until first underscore, capture rest before .json
+    # e.g. 2025-12-15T20-46-37+0100_allenai_olmo-2-1124-7b-instruct.json
+    m = re.match(r"^[^_]+_(.+?)\.json$", name)
+    if not m:
+        return name.rsplit('.', 1)[0]
+    slug = m.group(1)
+    # remove trailing _pt-pt or multiple underscores + pt-pt
+    slug = re.sub(r"_+pt-pt$", "", slug)
+    return slug
+
+
+def iter_json_array(path: Path, chunk_size=1 << 20):
+    """Yield the elements of a top-level JSON array, reading `chunk_size` chars at a time."""
+    ws = re.compile(r'\s*')
+    separators = re.compile(r'[\s,]*')
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buf = f.read(chunk_size)
+        while buf.isspace():
+            buf += f.read(chunk_size)
+        buf = buf.lstrip()
+        if not buf.startswith('['):
+            raise ValueError('expected a top-level JSON array')
+        pos, eof = 1, False
+        while True:
+            pos = separators.match(buf, pos).end()
+            if buf.startswith(']', pos):
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                # a value not yet followed by ',' or ']' may have been cut short (e.g. a number)
+                complete = buf.startswith((',', ']'), ws.match(buf, end).end())
+            except json.JSONDecodeError:
+                complete = False
+            if not complete:
+                if eof:
+                    raise ValueError('truncated or malformed JSON array')
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+
+
+def parse_eval_file(path):
+    """Extract what the scripts need from one JSON file.
+
+    Returns a dict with `count` (array length), `model_names`
+    ({name: occurrences}), `raw_outputs` ([prompt_id, raw_output] pairs,
+    first non-empty one per prompt) and `error` (None, or why parsing failed).
+    """
+    record = {'count': 0, 'model_names': {}, 'raw_outputs': [], 'error': None}
+    names = Counter()
+    raw_outputs = {}
+    try:
+        for obj in iter_json_array(Path(path)):
+            record['count'] += 1
+            if not isinstance(obj, dict):
+                continue
+            if 'model_name' in obj:
+                names[obj['model_name']] += 1
+            prompt_id = obj.get('prompt_id') or obj.get('conversation_id')
+            raw = obj.get('raw_output')
+            if prompt_id and raw and prompt_id not in raw_outputs:
+                raw_outputs[prompt_id] = raw
+    except Exception as e:
+        record['error'] = str(e)
+        return record
+    record['model_names'] = dict(names)
+    record['raw_outputs'] = list(raw_outputs.items())
+    return record
+
+
+def _open_cache(evals_dir: Path):
+    conn = sqlite3.connect(evals_dir / CACHE_NAME)
+    conn.execute('''CREATE TABLE IF NOT EXISTS files (
+        name TEXT PRIMARY KEY,
+        mtime_ns INTEGER,
+        size INTEGER,
+        record BLOB
+    )''')
+    return conn
+
+
+def load_eval_dir(evals_dir: Path, workers=None, use_cache=True):
+    """Return [(file name, slug, record)] for every `*.json` in `evals_dir`, sorted by name.
+
+    `record` is the dict described in `parse_eval_file`.
+    """
+    paths = sorted(evals_dir.glob('*.json'))
+    stats = {p.name: os.stat(p) for p in paths}
+    records = {}
+    cache = _open_cache(evals_dir) if use_cache else None
+    if cache is not None:
+        for name, mtime_ns, size, blob in cache.execute('SELECT name, mtime_ns, size, record FROM files'):
+            st = stats.get(name)
+            if st is not None and (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+                records[name] = json.loads(zlib.decompress(blob))
+
+    todo = [p for p in paths if p.name not in records]
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_eval_file, todo))
+    else:
+        parsed = [parse_eval_file(p) for p in todo]
+    for p, record in zip(todo, parsed):
+        records[p.name] = record
+
+    if cache is not None:
+        if todo:
+            print(f"Parsed {len(todo)} JSON files ({len(paths) - len(todo)} from cache)")
+        cache.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', [
+            (p.name, stats[p.name].st_mtime_ns, stats[p.name].st_size,
+             zlib.compress(json.dumps(records[p.name]).encode('utf-8')))
+            for p in todo])
+        cache.execute(f"DELETE FROM files WHERE name NOT IN ({', '.join('?' * len(paths))})", list(stats))
+        cache.commit()
+        cache.close()
+    return [(p.name, slug_from_filename(p.name), records[p.name]) for p in paths]
@@ -0,0 +1,198 @@
+"""Give models display names through the `model_aliases` table (see aliases.py).
+
+Usage:
+    python scripts/rename_models.py [--db PATH] list
+    python scripts/rename_models.py [--apply] [--db PATH] set RAW_NAME DISPLAY_NAME
+    python scripts/rename_models.py [--apply] [--db PATH] unset RAW_NAME
+    python scripts/rename_models.py [--apply] [--db PATH] suffixes
+    python scripts/rename_models.py [--apply] [--db PATH] from-evals [--evals-dir PATH] [--workers N]
+
+`suffixes` aliases every model whose raw name ends with a key of
+SUFFIX_RENAMES; `from-evals` aliases each checkpoint slug to the
+`model_name` its JSON files in `pt-pt-eval/` report. Rows are never
+rewritten: each rename is one row in `model_aliases`, and `unset` undoes it.
+
+By default this does a dry-run and prints the aliases it would write. Use
+--apply to actually modify the DB.
+
+A display name another model of the DB already shows under is refused:
+aliases are one-to-one within a DB (see aliases.py).
+"""
+import argparse
+import sqlite3
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from aliases import display_owner, load_aliases, remove_alias, set_alias
+from eval_json import load_eval_dir
+from storage import register_functions
+
+DEFAULT_DB = ROOT / 'pt_pt_conversation_evaluations.db'
+DEFAULT_EVALS = ROOT / 'pt-pt-eval'
+
+# Raw checkpoint name suffix -> display name
+SUFFIX_RENAMES = {
+    "47-32k-9B-carminho-with_euroblocks_safety_hermes_customst_checkpoint-2875": "AMALIA-9B 32k v49",
+    "47-4k-9B-carminho-with_euroblocks_safety_hermes_customst_checkpoint-13590": "AMALIA-9B 4k v49",
+    "47-32k-llama_checkpoint-700": "AMALIA-LLaMA-3.1-8B-32k",
+    "49-32k-llama_instruct_checkpoint-1767": "AMALIA-LLaMA-3.1-8B-Instruct-32k",
+    "47-32k-qwen3_8B_checkpoint-1482": "AMALIA-Qwen3-8B-32k",
+    "49-32k-eurollm-9B_checkpoint-1928": "EuroLLM-AMALIA-9B-32k v49",
+    "49-32k-gemma3-12B_checkpoint-1368": "AMALIA-Gemma3-12B-32k",
+    "47-safety-dpo-mix_safety_sft_200k_checkpoint-6738_merged": "49 DPO",
+    "50-carminho-big_checkpoint-3480": "AMALIA-9B-32k-big v50",
+    "50-dpo-mix_safety_sft_200k_if_checkpoint-6892_merged": "AMALIA-9B-32k-big-DPO-small v50",
+    "50-carminho-big-old_checkpoint-18501": "AMALIA-9B-4k-big v50",
+    "50-big-4k-dpo-big_checkpoint-6155_merged": "AMALIA-9B-4k-big-DPO-big v50",
+    "49-4k-eurollm-9B_checkpoint-12231": "EuroLLM AMALIA-9B 4k v49",
+}
+
+# Tables whose model_name column the aliases apply to, tried in order
+MODEL_TABLES = ('results', 'evaluations')
+
+
+def find_db(path=None):
+    if path:
+        p = Path(path)
+        if p.exists():
+            return p
+        raise FileNotFoundError(p)
+    for candidate in (DEFAULT_DB, ROOT / 'evaluations.db', ROOT / 'model_results.db', ROOT / 'new_results.db'):
+        if candidate.exists():
+            return candidate
+    dbs = list(ROOT.glob('*.db'))
+    if dbs:
+        return dbs[0]
+    raise FileNotFoundError('No .db file found in repo root')
+
+
+def db_model_names(conn):
+    """Distinct raw model names (an index-only scan on the viewer's DBs)."""
+    for table in MODEL_TABLES:
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if 'model_name' in columns:
+            return [row[0] for row in conn.execute(f'SELECT DISTINCT model_name FROM {table} ORDER BY model_name')]
+    raise SystemExit(f"No table with a model_name column ({', '.join(MODEL_TABLES)})")
+
+
+def suffix_mapping(models):
+    return {model: new for suffix, new in SUFFIX_RENAMES.items() for model in models if model.endswith(suffix)}
+
+
+def build_mapping(evals_dir: Path, workers=None):
+    mapping = defaultdict(Counter)  # slug -> Counter(display_name)
+    for name, slug, record in load_eval_dir(evals_dir, workers=workers):
+        if record['error']:
+            print(f"Skipping {name}: can't parse JSON ({record['error']})")
+            continue
+        if not record['count']:
+            print(f"Skipping {name}: empty JSON array")
+            continue
+        model_names = set(record['model_names'])
+        if not model_names:
+            print(f"Skipping {name}: no 'model_name' key found")
+            continue
+        # pick the most common model_name among entries
+        display = Counter(model_names).most_common(1)[0][0]
+        mapping[slug][display] += 1
+    resolved = {slug: next(iter(counter)) for slug, counter in mapping.items() if len(counter) == 1}
+    ambiguous = {slug: dict(counter) for slug, counter in mapping.items() if len(counter) > 1}
+    if ambiguous:
+        print('\nWARNING: Ambiguous model_name values found for the following slugs:')
+        for slug, cnts in ambiguous.items():
+            print(f"  {slug}: {cnts}")
+        print('These slugs will be skipped. Resolve duplicates in JSON files if needed.')
+    return resolved
+
+
+def apply_mapping(conn, mapping, models, dry_run):
+    """Alias each raw name in `mapping` that the DB has; returns how many aliases changed."""
+    aliases = load_aliases(conn)
+    changed = 0
+    for raw, display in sorted(mapping.items()):
+        if raw not in models or aliases.get(raw, raw) == display:
+            continue
+        owner = display_owner(aliases, models, raw, display)
+        if owner is not None:
+            print(f"  SKIPPED {raw} -> {display}: {owner} is already shown as {display}")
+            continue
+        print(f"  {raw} -> {display}")
+        if not dry_run:
+            set_alias(conn, raw, display)
+        aliases[raw] = display
+        changed += 1
+    return changed
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--db', type=str, help='Path to DB file')
+    ap.add_argument('--apply', action='store_true', help='Write the aliases to the DB (default: dry-run)')
+    commands = ap.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='Show every model and its display name')
+    cmd = commands.add_parser('set', help='Alias one model')
+    cmd.add_argument('raw_name')
+    cmd.add_argument('display_name')
+    cmd = commands.add_parser('unset', help='Show a model under its raw name again')
+    cmd.add_argument('raw_name')
+    commands.add_parser('suffixes', help='Alias models by raw name suffix (SUFFIX_RENAMES)')
+    cmd = commands.add_parser('from-evals', help='Alias checkpoint slugs to the model_name in their JSON files')
+    cmd.add_argument('--evals-dir', type=str, help='Path to JSON files dir', default=str(DEFAULT_EVALS))
+    cmd.add_argument('--workers', type=int, help='Processes used to parse new JSON files (default: CPU count)')
+    args = ap.parse_args()
+    dry_run = not args.apply
+
+    db_path = find_db(args.db)
+    print(f"Using DB: {db_path}")
+    # Compact DBs' results view calls inflate() (see storage.py)
+    conn = register_functions(sqlite3.connect(db_path))
+    models = db_model_names(conn)
+
+    if args.command == 'list':
+        aliases = load_aliases(conn)
+        for model in models:
+            print(f"  {model} -> {aliases[model]}" if model in aliases else f"  {model}")
+        stale = sorted(set(aliases) - set(models))
+        if stale:
+            print(f"Aliases for models not in the DB: {', '.join(stale)}")
+        raise SystemExit(0)
+
+    if args.command == 'set':
+        if args.raw_name not in models:
+            print(f"Note: {args.raw_name} has no rows in this DB (yet)")
+        mapping, models = {args.raw_name: args.display_name}, set(models) | {args.raw_name}
+    elif args.command == 'unset':
+        # Shown under its raw name again, which must not be another model's display name
+        owner = display_owner(load_aliases(conn), models, args.raw_name, args.raw_name)
+        if owner is not None:
+            raise SystemExit(f"{owner} is shown as {args.raw_name}; rename it first")
+        if dry_run:
+            print(f"Would show {args.raw_name} under its raw name again.\n"
+                  "Dry-run: no changes have been made. Rerun with --apply to make changes.")
+        elif not remove_alias(conn, args.raw_name):
+            print(f"{args.raw_name} has no alias")
+        conn.commit()
+        conn.close()
+        raise SystemExit(0)
+    elif args.command == 'suffixes':
+        mapping = suffix_mapping(models)
+    else:
+        evals_dir = Path(args.evals_dir)
+        if not evals_dir.exists():
+            raise SystemExit(f"Evaluations dir not found: {evals_dir}")
+        print(f"Scanning JSON files in: {evals_dir}")
+        mapping = build_mapping(evals_dir, args.workers)
+
+    print('\nAliases (raw name -> display name):')
+    changed = apply_mapping(conn, mapping, set(models), dry_run)
+    if not changed:
+        print('  (no changes)')
+    elif dry_run:
+        print('\nDry-run: no changes have been made. Rerun with --apply to make changes.')
+    else:
+        conn.commit()
+    conn.close()
@@ -0,0 +1,199 @@
+"""Generate synthetic benchmark DBs shaped like the real ones, at any scale.
+
+Usage:
+    python scripts/synthetic_dbs.py [--out DIR] [--rows N] [--models N] [--categories N] [--seed N]
+
+Writes `new_results.db` (results), `evaluations.db` (grouped evaluations)
+and `pt_pt_conversation_evaluations.db` (multi-turn conversations), each
+with about `--rows` rows spread over `--models` models. Text columns are
+drawn from a pool of Portuguese-like passages with lengths close to the
+real data, so search, previews and page sizes behave realistically.
+Used by scripts/benchmark.py.
+"""
+import argparse
+import random
+import sqlite3
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+WORDS = ('a o de que em para com uma um não por mais como mas foi ao ele das tem seu sua ou ser quando muito '
+         'nos já está também só pelo pela até isso ela entre era depois sem mesmo aos ter seus quem nas me esse '
+         'eles estão você tinha foram essa num nem suas meu às minha têm numa pelos elas havia seja qual será '
+         'Lisboa Porto Coimbra Braga Faro português portuguesa língua frase verbo resposta pergunta exemplo '
+         'cultura história tradição saudade fado pastel azulejo comboio autocarro pequeno-almoço telemóvel '
+         'ecrã equipa facto contacto receção direção conjugação gramática semântica pragmática registo').split()
+
+# Average characters per text column, after the checked-in new_results.db
+TEXT_LENGTHS = {
+    'prompt': 100, 'question': 100, 'context': 600,
+    'response': 2500, 'answer': 1200,
+    'explanation': 650, 'reasoning': 650, 'raw_output': 3000,
+}
+
+POOL_SIZE = 2000
+BATCH = 10000
+
+
+def text_pool(rng, length, size=POOL_SIZE):
+    """`size` passages averaging `length` characters."""
+    pool = []
+    for _ in range(size):
+        target = max(int(rng.gauss(length, length / 3)), 10)
+        words, n = [], 0
+        while n < target:
+            word = rng.choice(WORDS)
+            words.append(word)
+            n += len(word) + 1
+        pool.append(' '.join(words).capitalize() + '.')
+    return pool
+
+
+def model_names(count):
+    return [f'synthetic-model-{i:02d}' for i in range(count)]
+
+
+def _create(path, schema):
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute(schema)
+    return conn
+
+
+def _fill(conn, insert, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+    conn.commit()
+    conn.close()
+
+
+def make_results(path, rows, models, categories, rng):
+    """Results DB: every model answers the same documents, scores 1-5."""
+    conn = _create(path, '''CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        doc_id INTEGER,
+        doc_internal_id INTEGER,
+        category TEXT,
+        prompt TEXT,
+        response TEXT,
+        score REAL,
+        explanation TEXT
+    )''')
+    pools = {col: text_pool(rng, TEXT_LENGTHS[col]) for col in ('prompt', 'response', 'explanation')}
+    names = model_names(models)
+    cats = [f'Category {i}' for i in range(categories)]
+    docs = max(rows // models, 1)
+
+    def generate():
+        for doc in range(docs):
+            category = cats[doc % len(cats)]
+            for model in names:
+                yield (model, doc, doc, category, rng.choice(pools['prompt']), rng.choice(pools['response']),
+                       float(rng.choices((1, 2, 3, 4, 5), (1, 2, 3, 4, 3))[0]), rng.choice(pools['explanation']))
+
+    _fill(conn, 'INSERT INTO results (model_name, doc_id, doc_internal_id, category, prompt, response, score, '
+                'explanation) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', generate())
+
+
+def make_evaluations(path, rows, models, categories, rng):
+    """Grouped evaluations DB: scores 0-100."""
+    conn = _create(path, '''CREATE TABLE evaluations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        group_name TEXT,
+        doc_id INTEGER,
+        question TEXT,
+        answer TEXT,
+        reasoning TEXT,
+        score REAL
+    )''')
+    pools = {col: text_pool(rng, TEXT_LENGTHS[col]) for col in ('question', 'answer', 'reasoning')}
+    names = model_names(models)
+    groups = [f'group-{i}' for i in range(categories)]
+    docs = max(rows // models, 1)
+
+    def generate():
+        for doc in range(docs):
+            group = groups[doc % len(groups)]
+            for model in names:
+                yield (model, group, doc, rng.choice(pools['question']), rng.choice(pools['answer']),
+                       rng.choice(pools['reasoning']), float(min(max(int(rng.gauss(65, 20)), 0), 100)))
+
+    _fill(conn, 'INSERT INTO evaluations (model_name, group_name, doc_id, question, answer, reasoning, score) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', generate())
+
+
+def make_conversations(path, rows, models, turns, rng):
+    """Conversation DB: conversations 'pN' and their pt-pt variants 'pNt', scores 0-10."""
+    conn = _create(path, '''CREATE TABLE evaluations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        conversation_id TEXT,
+        turn_number INTEGER,
+        context TEXT,
+        response TEXT,
+        reasoning TEXT,
+        score REAL,
+        used_pt_pt_prompt INTEGER,
+        raw_output TEXT
+    )''')
+    pools = {col: text_pool(rng, TEXT_LENGTHS[col]) for col in ('context', 'response', 'reasoning', 'raw_output')}
+    names = model_names(models)
+    conversations = max(rows // (models * 2 * turns), 1)
+
+    def generate():
+        for conv in range(1, conversations + 1):
+            for pt_pt in (0, 1):
+                for turn in range(1, turns + 1):
+                    context = rng.choice(pools['context'])
+                    for model in names:
+                        yield (model, f"p{conv}{'t' if pt_pt else ''}", turn, context, rng.choice(pools['response']),
+                               rng.choice(pools['reasoning']), float(rng.randint(0, 10)), pt_pt,
+                               rng.choice(pools['raw_output']) if rng.random() < 0.5 else None)
+
+    _fill(conn, 'INSERT INTO evaluations (model_name, conversation_id, turn_number, context, response, reasoning, '
+                'score, used_pt_pt_prompt, raw_output) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', generate())
+
+
+def generate_all(out, rows, models, categories, turns=3, seed=0):
+    """Write the three synthetic DBs to `out`; returns their paths."""
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = {
+        'results': out / 'new_results.db',
+        'evaluations': out / 'evaluations.db',
+        'conversations': out / 'pt_pt_conversation_evaluations.db',
+    }
+    make_results(paths['results'], rows, models, categories, rng)
+    make_evaluations(paths['evaluations'], rows, models, categories, rng)
+    make_conversations(paths['conversations'], rows, models, turns, rng)
+    return paths
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--out', type=str, default=str(ROOT / 'bench-data'), help='Directory to write the DBs to')
+    ap.add_argument('--rows', type=int, default=10000, help='Approximate rows per DB (10k to 10M)')
+    ap.add_argument('--models', type=int, default=8, help='Number of models')
+    ap.add_argument('--categories', type=int, default=12, help='Categories (results) and groups (evaluations)')
+    ap.add_argument('--turns', type=int, default=3, help='Turns per conversation')
+    ap.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = ap.parse_args()
+
+    started = time.perf_counter()
+    paths = generate_all(args.out, args.rows, args.models, args.categories, args.turns, args.seed)
+    for kind, path in paths.items():
+        print(f"{kind}: {path} ({path.stat().st_size / 1e6:.1f} MB)")
+    print(f"Generated in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,150 @@
+"""Full-text search over the long text columns, backed by SQLite FTS5.
+
+`ensure_fts` gives each `results` / `evaluations` table an external-content
+FTS5 index (`<table>_fts`) over whichever text columns it has, kept in sync
+by triggers. The views then filter with `MATCH` and rank with bm25 instead
+of scanning every row with `LIKE '%...%'`.
+"""
+from markupsafe import Markup, escape
+
+import storage
+
+TEXT_COLUMNS = ('prompt', 'response', 'explanation', 'question', 'answer', 'reasoning', 'context', 'raw_output')
+TABLES = ('results', 'evaluations')
+
+# snippet() wraps matches in these; `highlight` turns them into <mark> after escaping
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def text_columns(conn, table):
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    return [col for col in TEXT_COLUMNS if col in columns]
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def has_fts(conn, table):
+    return conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (fts_table(table),)).fetchone() is not None
+
+
+def ensure_fts(conn):
+    """Create (or rebuild, if the text columns changed) the FTS index of each table.
+
+    Returns the names of the FTS tables that were (re)built.
+    """
+    built = []
+    for table in TABLES:
+        columns = text_columns(conn, table)
+        if not columns:
+            continue
+        fts = fts_table(table)
+        if has_fts(conn, table):
+            if [row[1] for row in conn.execute(f'PRAGMA table_info({fts})')] == columns:
+                continue
+            conn.execute(f'DROP TABLE {fts}')
+        cols = ', '.join(columns)
+        conn.execute(f"""CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id',
+                         tokenize='unicode61 remove_diacritics 2')""")
+        _sync_triggers(conn, table, fts, columns)
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        built.append(fts)
+    conn.commit()
+    return built
+
+
+def _sync_triggers(conn, table, fts, columns):
+    if storage.is_compact(conn, table):
+        # `table` is a view; sync from its store instead
+        storage.fts_triggers(conn, table, fts, columns)
+        return
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{col}' for col in columns)
+    old_cols = ', '.join(f'old.{col}' for col in columns)
+    conn.executescript(f'''
+        DROP TRIGGER IF EXISTS {fts}_ai;
+        DROP TRIGGER IF EXISTS {fts}_ad;
+        DROP TRIGGER IF EXISTS {fts}_au;
+        CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+        CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END;
+        CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END;
+    ''')
+
+
+def drop_fts_triggers(conn, table):
+    """Stop keeping `table`'s FTS index in sync, e.g. for a bulk load; see `rebuild_fts`."""
+    fts = fts_table(table)
+    for suffix in ('ai', 'ad', 'bu', 'au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    conn.commit()
+
+
+def rebuild_fts(conn, table):
+    """Restore the sync triggers of `table`'s FTS index and rebuild it in one pass.
+
+    Returns whether the table has an FTS index at all.
+    """
+    if not has_fts(conn, table):
+        return False
+    fts = fts_table(table)
+    _sync_triggers(conn, table, fts, [row[1] for row in conn.execute(f'PRAGMA table_info({fts})')])
+    conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+
+def fts_query(text):
+    """Quote each word so user input is matched literally (all words required)."""
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def search_filter(conn, table, q, where, params):
+    """Add a text-search condition for `q` to a view's WHERE clause.
+
+    Uses the FTS index when the DB has one and falls back to `LIKE` on each
+    text column for DBs that could not be provisioned.
+    """
+    if not q.strip():
+        return where, params
+    if has_fts(conn, table):
+        fts = fts_table(table)
+        return where + f' AND id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH ?)', params + [fts_query(q)]
+    columns = text_columns(conn, table)
+    if not columns:
+        return where, params
+    where += ' AND (' + ' OR '.join(f'{col} LIKE ?' for col in columns) + ')'
+    return where, params + [f'%{q}%'] * len(columns)
+
+
+def fetch_search_page(cursor, table, q, where, params, per_page, page, select='t.*'):
+    """Fetch one page of matches for `q`, best bm25 rank first, with a highlighted `snippet`.
+
+    `where`/`params` are the view's other filters, without the search condition.
+    `select` columns must be qualified with the table alias `t`.
+    """
+    fts = fts_table(table)
+    conditions = where.replace(' WHERE 1=1', '', 1)
+    query = f'''
+        SELECT {select}, snippet({fts}, -1, '{MARK_START}', '{MARK_END}', '…', 32) AS snippet
+        FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+        WHERE {fts} MATCH ?{conditions}
+        ORDER BY {fts}.rank
+        LIMIT {per_page} OFFSET {(page - 1) * per_page}
+    '''
+    return cursor.execute(query, [fts_query(q)] + list(params)).fetchall()
+
+
+def highlight(snippet):
+    """Jinja filter: escape a snippet and mark up the matched terms."""
+    if not snippet:
+        return ''
+    text = str(escape(snippet))
+    return Markup(text.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
@@ -0,0 +1,97 @@
+"""Bootstrap confidence intervals and paired permutation tests.
+
+Scores are handled as a distribution: the distinct values and how often each
+occurs. Resampling n scores with replacement is the same as drawing
+multinomial counts over those values, so one bootstrap replicate costs
+O(distinct values) rather than O(n). Benchmark scores only take a handful of
+values (1-5, 0-10, 0-100), which keeps the intervals cheap even for large
+tables; near-continuous scores fall back to resampling indices. Replicates
+are drawn in vectorized blocks.
+
+NumPy is optional: without it every function returns None and the pages
+show point estimates only.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CONFIDENCE = 0.95
+BOOTSTRAP_SAMPLES = 2000
+PERMUTATIONS = 10000
+# Fixed seed: the same data always gives the same interval, which keeps cached pages consistent
+SEED = 0
+# Above this many distinct values, resample indices instead of drawing multinomial counts
+MULTINOMIAL_MAX_VALUES = 1000
+# Upper bound on the cells (replicates x distinct values) drawn per block
+BLOCK_CELLS = 1 << 22
+
+
+def _blocks(total, width):
+    size = max(1, BLOCK_CELLS // max(width, 1))
+    for start in range(0, total, size):
+        yield min(size, total - start)
+
+
+def bootstrap_ci(values, counts=None, confidence=CONFIDENCE, samples=BOOTSTRAP_SAMPLES, seed=SEED):
+    """Percentile bootstrap intervals of the mean and the median.
+
+    `values` are the distinct scores and `counts` how often each occurs;
+    without `counts`, `values` are the individual scores. Returns
+    {'mean_ci': (low, high), 'median_ci': (low, high)}, or None without
+    NumPy or with fewer than two scores.
+    """
+    if np is None:
+        return None
+    if counts is None:
+        values, counts = np.unique(np.asarray(values, dtype=float), return_counts=True)
+    values = np.asarray(values, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    n = int(counts.sum())
+    if n < 2:
+        return None
+    order = np.argsort(values)
+    values, counts = values[order], counts[order]
+    rng = np.random.default_rng(seed)
+    means, medians = [], []
+    if len(values) <= MULTINOMIAL_MAX_VALUES:
+        for size in _blocks(samples, len(values)):
+            draws = rng.multinomial(n, counts / n, size=size)
+            means.append(draws @ values / n)
+            # Same rank as queries.score_stats: the (n // 2 + 1)-th smallest score
+            medians.append(values[np.argmax(draws.cumsum(axis=1) > n // 2, axis=1)])
+    else:
+        # Near-continuous scores: plain index resampling is cheaper
+        scores = np.repeat(values, counts)
+        for size in _blocks(samples, n):
+            draws = scores[rng.integers(0, n, size=(size, n))]
+            means.append(draws.mean(axis=1))
+            medians.append(np.partition(draws, n // 2, axis=1)[:, n // 2])
+    tail = (1 - confidence) / 2 * 100
+    bounds = [tail, 100 - tail]
+    return {
+        'mean_ci': tuple(np.percentile(np.concatenate(means), bounds).tolist()),
+        'median_ci': tuple(np.percentile(np.concatenate(medians), bounds).tolist()),
+    }
+
+
+def paired_permutation_test(deltas, permutations=PERMUTATIONS, seed=SEED):
+    """Two-sided sign-flip permutation test of mean(deltas) == 0.
+
+    Under the null each paired difference is equally likely to have either
+    sign. Flipping the signs of all deltas of the same magnitude is drawn as
+    one binomial count. Returns the p-value, or None without NumPy or data.
+    """
+    if np is None or len(deltas) == 0:
+        return None
+    deltas = np.asarray(deltas, dtype=float)
+    magnitudes, counts = np.unique(np.abs(deltas), return_counts=True)
+    observed = abs(deltas.sum())
+    tolerance = 1e-9 * max(1.0, observed)
+    rng = np.random.default_rng(seed)
+    extreme = 0
+    for size in _blocks(permutations, len(magnitudes)):
+        positive = rng.binomial(counts, 0.5, size=(size, len(counts)))
+        sums = (2 * positive - counts) @ magnitudes
+        extreme += int(np.count_nonzero(np.abs(sums) >= observed - tolerance))
+    return (extreme + 1) / (permutations + 1)
@@ -0,0 +1,225 @@
+"""Compact storage layout for `results`: deduplicated prompts, compressed text.
+
+`compact` moves a `results` table into
+
+    prompts(id, text)        one row per distinct prompt, keyed by a 64-bit content hash
+    results_store(...)       the results columns, with `prompt_id` instead of
+                             `prompt` and the long text columns compressed
+
+and replaces `results` with a VIEW of the original columns, so every query,
+index-backed filter and FTS index keeps working unchanged. The view's text
+columns are decompressed by the `inflate()` SQL function, which SQLite only
+calls for the columns a query actually selects: metadata scans (stats,
+leaderboard, pairing) read only the small store rows, never the prompts.
+INSTEAD OF triggers route INSERT, UPDATE and DELETE on the view to the store.
+
+Compressed values are BLOBs whose first byte names the codec (zlib, or zstd
+when the `zstandard` package is installed); short values stay plain TEXT.
+Every connection that reads a compact DB needs `register_functions`.
+"""
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+COMPACT_TABLES = ('results',)
+PROMPT_COLUMN = 'prompt'
+# Compressed in place when long enough to gain from it
+COMPRESSED_COLUMNS = ('response', 'explanation', 'answer', 'reasoning', 'context', 'raw_output')
+MIN_COMPRESS_BYTES = 128
+
+CODECS = {'zlib': 1, 'zstd': 2}
+
+
+def store_table(table):
+    return f'{table}_store'
+
+
+def content_hash(text):
+    """Signed 64-bit BLAKE2b hash of `text`, used as the prompt id."""
+    if text is None:
+        return None
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def deflate(text, codec='zlib'):
+    """Compress `text` to a codec-tagged BLOB, or return it as is if that does not pay off."""
+    if not isinstance(text, str):
+        return text
+    raw = text.encode('utf-8')
+    if len(raw) < MIN_COMPRESS_BYTES:
+        return text
+    if codec == 'zstd' and zstandard is not None:
+        packed = bytes([CODECS['zstd']]) + zstandard.ZstdCompressor(level=9).compress(raw)
+    else:
+        packed = bytes([CODECS['zlib']]) + zlib.compress(raw, 9)
+    return packed if len(packed) < len(raw) else text
+
+
+def inflate(value):
+    """Inverse of `deflate`; TEXT and NULL pass through."""
+    if not isinstance(value, bytes) or not value:
+        return value
+    codec, payload = value[0], value[1:]
+    if codec == CODECS['zlib']:
+        return zlib.decompress(payload).decode('utf-8')
+    if codec == CODECS['zstd']:
+        if zstandard is None:
+            raise ValueError('This DB has zstd-compressed text; install the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    return value
+
+
+def register_functions(conn):
+    """Make `inflate`, `deflate` and `content_hash` available to SQL on `conn`."""
+    conn.create_function('inflate', 1, inflate, deterministic=True)
+    conn.create_function('deflate', 2, deflate, deterministic=True)
+    conn.create_function('content_hash', 1, content_hash, deterministic=True)
+    return conn
+
+
+def is_compact(conn, table):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+    return row is not None and row[0] == 'view' and physical_table(conn, table) != table
+
+
+def physical_table(conn, table):
+    """The table that holds `table`'s rows: its store when compact, else itself."""
+    store = store_table(table)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (store,)).fetchone():
+        return store
+    return table
+
+
+def logical_table(table):
+    """Inverse of `store_table`: the name queries use for a table's rows."""
+    for name in COMPACT_TABLES:
+        if table == store_table(name):
+            return name
+    return table
+
+
+def _encode(column, value, codec):
+    # SQL that turns the view value `value` of `column` into what the store holds
+    if column == PROMPT_COLUMN:
+        return f'content_hash({value})'
+    if column in COMPRESSED_COLUMNS:
+        return f"deflate({value}, '{codec}')"
+    return value
+
+
+def _store_column(column):
+    return 'prompt_id' if column == PROMPT_COLUMN else column
+
+
+def compact(conn, table='results', codec='zlib'):
+    """Move `table` to the compact layout. Returns False if it already is, or does not exist.
+
+    Runs in one transaction; VACUUM afterwards to give the space back.
+    """
+    info = [row for row in conn.execute(f'PRAGMA table_xinfo({table})') if row[6] == 0]
+    if not info or is_compact(conn, table):
+        return False
+    store = store_table(table)
+    columns = [row[1] for row in info]
+    defs = []
+    for _, name, kind, notnull, default, pk, _ in info:
+        if name == 'id':
+            defs.append('id INTEGER PRIMARY KEY AUTOINCREMENT')
+        elif name == PROMPT_COLUMN:
+            defs.append('prompt_id INTEGER')
+        elif name in COMPRESSED_COLUMNS:
+            # No declared type: holds TEXT and compressed BLOBs side by side
+            defs.append(name)
+        else:
+            defs.append(f'{name} {kind}'.strip())
+    store_columns = ', '.join(_store_column(col) for col in columns)
+
+    conn.execute('BEGIN')
+    conn.execute('CREATE TABLE IF NOT EXISTS prompts (id INTEGER PRIMARY KEY, text)')
+    conn.execute(f"CREATE TABLE {store} ({', '.join(defs)})")
+    if PROMPT_COLUMN in columns:
+        conn.execute(f'''INSERT OR IGNORE INTO prompts (id, text)
+                         SELECT content_hash({PROMPT_COLUMN}), deflate({PROMPT_COLUMN}, ?)
+                         FROM (SELECT DISTINCT {PROMPT_COLUMN} FROM {table} WHERE {PROMPT_COLUMN} IS NOT NULL)''',
+                     (codec,))
+    conn.execute(f"INSERT INTO {store} ({store_columns}) "
+                 f"SELECT {', '.join(_encode(col, col, codec) for col in columns)} FROM {table} ORDER BY id")
+    # The FTS index and its triggers point at the table; ensure_fts rebuilds them on the view
+    conn.execute(f'DROP TABLE IF EXISTS {table}_fts')
+    conn.execute(f'DROP TABLE {table}')
+
+    select = []
+    for col in columns:
+        if col == PROMPT_COLUMN:
+            # A subquery rather than a join: SQLite keeps unused LEFT JOINs in aggregates
+            select.append(f'(SELECT inflate(text) FROM prompts WHERE id = s.prompt_id) AS {col}')
+        elif col in COMPRESSED_COLUMNS:
+            select.append(f'inflate(s.{col}) AS {col}')
+        else:
+            select.append(f's.{col}')
+    conn.execute(f"CREATE VIEW {table} AS SELECT {', '.join(select)} FROM {store} s")
+
+    add_prompt = (f"INSERT OR IGNORE INTO prompts (id, text) SELECT content_hash(new.{PROMPT_COLUMN}), "
+                  f"deflate(new.{PROMPT_COLUMN}, '{codec}') WHERE new.{PROMPT_COLUMN} IS NOT NULL;"
+                  if PROMPT_COLUMN in columns else '')
+    # One UPDATE per changed column, so e.g. a rename neither recompresses text nor touches the FTS index
+    updates = '\n'.join(
+        f"UPDATE {store} SET {_store_column(col)} = {_encode(col, f'new.{col}', codec)} "
+        f"WHERE id = old.id AND new.{col} IS NOT old.{col};"
+        for col in columns if col != 'id')
+    # Separate statements: executescript() would commit the transaction first
+    conn.execute(f'''CREATE TRIGGER {table}_insert INSTEAD OF INSERT ON {table} BEGIN
+        {add_prompt}
+        INSERT INTO {store} ({store_columns})
+        VALUES ({', '.join(_encode(col, f'new.{col}', codec) for col in columns)});
+    END''')
+    conn.execute(f'''CREATE TRIGGER {table}_update INSTEAD OF UPDATE ON {table} BEGIN
+        {add_prompt}
+        {updates}
+    END''')
+    conn.execute(f'''CREATE TRIGGER {table}_delete INSTEAD OF DELETE ON {table} BEGIN
+        DELETE FROM {store} WHERE id = old.id;
+    END''')
+    conn.commit()
+    return True
+
+
+def fts_triggers(conn, table, fts, columns):
+    """Keep `fts` in sync with compact `table` through triggers on its store.
+
+    The triggers read the decompressed values back through the view.
+    """
+    store = store_table(table)
+    cols = ', '.join(columns)
+    watched = ', '.join(_store_column(col) for col in columns)
+    conn.executescript(f'''
+        DROP TRIGGER IF EXISTS {fts}_ai;
+        DROP TRIGGER IF EXISTS {fts}_ad;
+        DROP TRIGGER IF EXISTS {fts}_bu;
+        DROP TRIGGER IF EXISTS {fts}_au;
+        CREATE TRIGGER {fts}_ai AFTER INSERT ON {store} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) SELECT id, {cols} FROM {table} WHERE id = new.id;
+        END;
+        CREATE TRIGGER {fts}_ad BEFORE DELETE ON {store} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) SELECT 'delete', id, {cols} FROM {table} WHERE id = old.id;
+        END;
+        CREATE TRIGGER {fts}_bu BEFORE UPDATE OF {watched} ON {store} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) SELECT 'delete', id, {cols} FROM {table} WHERE id = old.id;
+        END;
+        CREATE TRIGGER {fts}_au AFTER UPDATE OF {watched} ON {store} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) SELECT id, {cols} FROM {table} WHERE id = new.id;
+        END;
+    ''')
+
+
+def prune_prompts(conn, table='results'):
+    """Delete prompts no row of compact `table` refers to any more. Returns how many."""
+    cur = conn.execute(f'DELETE FROM prompts WHERE id NOT IN (SELECT prompt_id FROM {store_table(table)} '
+                       'WHERE prompt_id IS NOT NULL)')
+    conn.commit()
+    return cur.rowcount
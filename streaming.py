@@ -0,0 +1,84 @@
+"""Streamed, compressed HTML for the list pages.
+
+`stream_page` renders a template with `flask.stream_template`: the page
+head and filters go out as soon as they are rendered and the result cards
+follow in chunks of about BUFFER_BYTES, so neither the browser nor the
+server waits on (or holds) the whole page. A template outputs `{{ flush }}`
+to send what it has before a slow query runs (see views.list_context).
+Chunks are compressed on the fly, with brotli when the client takes it and
+the `brotli` package is installed, else gzip; each one is flushed so the
+browser can render it. The response cache stores the compressed body once
+it has been sent (see cache.cached_response).
+
+STREAM_PAGES=0 renders pages whole and uncompressed, as does PROFILE_SQL=1
+(its debug footer needs the whole page; see profiling.py).
+"""
+import os
+import zlib
+
+from flask import Response, render_template, request, stream_template
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+ENABLED = os.environ.get('STREAM_PAGES', '1') != '0'
+BUFFER_BYTES = 16 * 1024
+# `{{ flush }}` in a template sends what is buffered so far, e.g. before a slow
+# query runs; the marker itself is dropped
+FLUSH = Markup('<!-- flush -->')
+
+
+def accepted_encoding():
+    """'br', 'gzip' or None: the best compression both sides support."""
+    if brotli is not None and 'br' in request.accept_encodings:
+        return 'br'
+    if 'gzip' in request.accept_encodings:
+        return 'gzip'
+    return None
+
+
+def _buffered(pieces):
+    # Jinja yields every bit of output separately; send them in fewer, larger chunks
+    buffer, size = [], 0
+    for piece in pieces:
+        if piece == FLUSH:
+            if buffer:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+            continue
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BUFFER_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def _compressed(chunks, encoding):
+    if encoding == 'br':
+        encoder = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            yield encoder.process(chunk) + encoder.flush()
+        yield encoder.finish()
+    else:
+        encoder = zlib.compressobj(5, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield encoder.compress(chunk) + encoder.flush(zlib.Z_SYNC_FLUSH)
+        yield encoder.flush()
+
+
+def stream_page(template_name, **context):
+    """Response streaming `template_name` rendered with `context`, compressed if the client allows."""
+    if not ENABLED:
+        return render_template(template_name, **context).replace(FLUSH, '')
+    encoding = accepted_encoding()
+    chunks = _buffered(stream_template(template_name, **context))
+    response = Response(_compressed(chunks, encoding) if encoding else chunks, mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,66 @@
+"""federation.py: model aliases and score scales across attached DBs."""
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from aliases import ensure_alias_table, set_alias
+from federation import MAX_ATTACHED, Federation, model_scores
+from storage import compact, register_functions
+
+
+def make_db(path, scores, aliases=(), compacted=False):
+    """A results DB with `scores` as {model: [score]} and `aliases` as (raw, display) pairs."""
+    conn = register_functions(sqlite3.connect(path))
+    conn.execute('''CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        category TEXT,
+        prompt TEXT,
+        score REAL
+    )''')
+    conn.executemany('INSERT INTO results (model_name, category, prompt, score) VALUES (?, ?, ?, ?)',
+                     [(model, 'c', f'p{i}', score) for model, values in scores.items()
+                      for i, score in enumerate(values)])
+    ensure_alias_table(conn)
+    for raw, display in aliases:
+        set_alias(conn, raw, display)
+    conn.commit()
+    if compacted:
+        compact(conn)
+    conn.close()
+    return str(path)
+
+
+def scores_by_model(db_paths):
+    federation = Federation()
+    with federation.connections(db_paths) as conns:
+        rows = [row for conn in conns for row in model_scores(conn)]
+    merged = {}
+    for row in rows:
+        merged.setdefault(row['model_name'], {})[Path(row['source']).name] = (row['n'], row['mean'])
+    return merged
+
+
+@pytest.mark.parametrize('compacted', [False, True])
+def test_aliases_merge_models_across_dbs(tmp_path, compacted):
+    first = make_db(tmp_path / 'first.db', {'ckpt-1767': [4, 5], 'other': [1]},
+                    aliases=[('ckpt-1767', 'Model A')], compacted=compacted)
+    second = make_db(tmp_path / 'second.db', {'Model A': [3, 3, 3], 'ckpt-1767': [2]})
+    assert scores_by_model([first, second]) == {
+        'Model A': {'first.db': (2, 4.5), 'second.db': (3, 3.0)},
+        # Aliases only apply within their own DB
+        'ckpt-1767': {'second.db': (1, 2.0)},
+        'other': {'first.db': (1, 1.0)},
+    }
+
+
+def test_aliases_in_every_batch(tmp_path):
+    # More DBs than one connection can attach
+    paths = [make_db(tmp_path / f'db{i:02}.db', {f'raw-{i}': [5]}, aliases=[(f'raw-{i}', 'Shared')])
+             for i in range(MAX_ATTACHED + 2)]
+    assert scores_by_model(paths) == {'Shared': {Path(path).name: (1, 5.0) for path in paths}}
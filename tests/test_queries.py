@@ -0,0 +1,91 @@
+"""queries.py against the straightforward queries it replaced, on a synthetic DB."""
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from queries import CONVERSATION_KEY, ID_KEY, PERCENTILES, fetch_page, score_stats
+
+WHERE = ' WHERE 1=1'
+PER_PAGE = 7
+
+
+@pytest.fixture
+def conn():
+    rng = random.Random(0)
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT,
+        turn_number INTEGER,
+        category TEXT,
+        score REAL
+    )''')
+    conn.executemany('INSERT INTO results (conversation_id, turn_number, category, score) VALUES (?, ?, ?, ?)',
+                     [(f'conv:{rng.randrange(12)}', rng.randrange(4), rng.choice(('a', 'b')),
+                       None if rng.random() < 0.1 else rng.choice((1, 2, 2.5, 3, 4, 5)))
+                      for _ in range(100)])
+    yield conn
+    conn.close()
+
+
+def offset_pages(conn, key, descending, where=WHERE, params=()):
+    order = ', '.join(f"{col} {'DESC' if descending else 'ASC'}" for col, _ in key)
+    rows = [tuple(row) for row in conn.execute(f'SELECT * FROM results{where} ORDER BY {order}', params)]
+    return [rows[i:i + PER_PAGE] for i in range(0, len(rows), PER_PAGE)]
+
+
+@pytest.mark.parametrize('key, descending', [(ID_KEY, True), (CONVERSATION_KEY, False)])
+def test_keyset_pages_match_offset_pages(conn, key, descending):
+    expected = offset_pages(conn, key, descending)
+    pages, after = [], ''
+    for page in range(1, len(expected) + 1):
+        rows, _, after = fetch_page(conn.cursor(), 'results', WHERE, [], key, descending, PER_PAGE, page, after)
+        pages.append([tuple(row) for row in rows])
+    assert pages == expected
+
+    # And back again from the last page
+    before = fetch_page(conn.cursor(), 'results', WHERE, [], key, descending, PER_PAGE, len(expected))[1]
+    for page in range(len(expected) - 1, 0, -1):
+        rows, before, _ = fetch_page(conn.cursor(), 'results', WHERE, [], key, descending, PER_PAGE, page,
+                                     before=before)
+        assert [tuple(row) for row in rows] == expected[page - 1]
+
+
+def test_keyset_pages_with_filter(conn):
+    where, params = WHERE + ' AND category = ?', ['b']
+    expected = offset_pages(conn, ID_KEY, True, where, params)
+    rows, _, after = fetch_page(conn.cursor(), 'results', where, params, ID_KEY, True, PER_PAGE, 1)
+    rows, _, _ = fetch_page(conn.cursor(), 'results', where, params, ID_KEY, True, PER_PAGE, 2, after)
+    assert [tuple(row) for row in rows] == expected[1]
+
+
+def test_malformed_cursor_falls_back_to_offset(conn):
+    rows, _, _ = fetch_page(conn.cursor(), 'results', WHERE, [], CONVERSATION_KEY, False, PER_PAGE, 3, 'nonsense')
+    assert [tuple(row) for row in rows] == offset_pages(conn, CONVERSATION_KEY, False)[2]
+
+
+@pytest.mark.parametrize('where, params', [(WHERE, []), (WHERE + ' AND category = ?', ['a'])])
+def test_score_stats_match_sorted_scores(conn, where, params):
+    rows = [row[0] for row in conn.execute(f'SELECT score FROM results{where}', params)]
+    scores = sorted(score for score in rows if score is not None)
+    stats = score_stats(conn.cursor(), 'results', where, params)
+    assert stats['total_count'] == len(rows)
+    assert stats['avg_score'] == round(sum(scores) / len(scores), 2)
+    assert stats['min_score_val'] == scores[0]
+    assert stats['max_score_val'] == scores[-1]
+    # The baseline's median: the (n // 2 + 1)-th smallest score
+    for name, pct in PERCENTILES:
+        assert stats[f'{name}_score'] == scores[len(scores) * pct // 100]
+
+
+def test_score_stats_without_rows(conn):
+    stats = score_stats(conn.cursor(), 'results', WHERE + ' AND 0', [])
+    assert stats['total_count'] == 0
+    assert stats['median_score'] == 0
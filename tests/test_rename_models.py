@@ -0,0 +1,80 @@
+"""scripts/rename_models.py against a DB in the compact storage layout (see storage.py)."""
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from aliases import load_aliases
+from storage import compact, is_compact, register_functions
+
+SCRIPT = ROOT / 'scripts' / 'rename_models.py'
+RAW_NAME = 'x-49-32k-llama_instruct_checkpoint-1767'
+
+
+@pytest.fixture
+def compact_db(tmp_path):
+    path = tmp_path / 'compact.db'
+    conn = register_functions(sqlite3.connect(path))
+    conn.execute('''CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        doc_internal_id INTEGER,
+        category TEXT,
+        prompt TEXT,
+        response TEXT,
+        score REAL,
+        explanation TEXT
+    )''')
+    conn.executemany('INSERT INTO results (model_name, doc_internal_id, category, prompt, response, score, explanation) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     [(model, doc, 'gramática', f'Pergunta {doc} ' * 20, 'Resposta ' * 40, 3, 'Explicação ' * 20)
+                      for model in (RAW_NAME, 'other-model') for doc in range(5)])
+    conn.commit()
+    assert compact(conn)
+    assert is_compact(conn, 'results')
+    conn.close()
+    return path
+
+
+def rename(db_path, *args):
+    return subprocess.run([sys.executable, str(SCRIPT), '--db', str(db_path), *args],
+                          capture_output=True, text=True, check=True).stdout
+
+
+def aliases(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return load_aliases(conn)
+    finally:
+        conn.close()
+
+
+def test_list(compact_db):
+    out = rename(compact_db, 'list')
+    assert RAW_NAME in out and 'other-model' in out
+
+
+def test_set_and_unset(compact_db):
+    rename(compact_db, '--apply', 'set', 'other-model', 'Other Model')
+    assert aliases(compact_db) == {'other-model': 'Other Model'}
+    assert 'other-model -> Other Model' in rename(compact_db, 'list')
+    rename(compact_db, 'unset', 'other-model')
+    assert aliases(compact_db) == {'other-model': 'Other Model'}
+    rename(compact_db, '--apply', 'unset', 'other-model')
+    assert aliases(compact_db) == {}
+
+
+def test_dry_run_by_default(compact_db):
+    out = rename(compact_db, 'set', 'other-model', 'Other Model')
+    assert 'other-model -> Other Model' in out and 'Dry-run' in out
+    assert aliases(compact_db) == {}
+
+
+def test_suffixes(compact_db):
+    rename(compact_db, '--apply', 'suffixes')
+    assert aliases(compact_db) == {RAW_NAME: 'AMALIA-LLaMA-3.1-8B-Instruct-32k'}
@@ -0,0 +1,65 @@
+"""storage.py: a compacted `results` table reads and writes like the plain one."""
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from storage import CODECS, compact, is_compact, prune_prompts, register_functions, zstandard
+
+COLUMNS = 'id, model_name, doc_internal_id, category, prompt, response, score, explanation'
+
+
+def rows(conn):
+    return conn.execute(f'SELECT {COLUMNS} FROM results ORDER BY id').fetchall()
+
+
+@pytest.fixture
+def conn():
+    conn = register_functions(sqlite3.connect(':memory:'))
+    conn.execute('''CREATE TABLE results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT,
+        doc_internal_id INTEGER,
+        category TEXT,
+        prompt TEXT,
+        response TEXT,
+        score REAL,
+        explanation TEXT
+    )''')
+    # Every prompt is shared by three models; some text is short, some NULL, some non-ASCII
+    conn.executemany(f'INSERT INTO results ({COLUMNS}) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)',
+                     [(model, doc, 'gramática', f'Pergunta {doc}: ' + 'ção ' * 200 * (doc % 2),
+                       None if doc == 3 else f'Resposta {model} ' * 50, doc % 5 + 1, 'ok' if doc % 2 else None)
+                      for model in ('a', 'b', 'c') for doc in range(6)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+def test_round_trip(conn, codec):
+    if codec == 'zstd' and zstandard is None:
+        pytest.skip('zstandard is not installed')
+    before = rows(conn)
+    assert compact(conn, codec=codec)
+    assert is_compact(conn, 'results')
+    assert rows(conn) == before
+    assert conn.execute('SELECT COUNT(*) FROM prompts').fetchone()[0] == 6
+    assert not compact(conn)
+
+
+def test_writes_through_the_view(conn):
+    assert compact(conn)
+    conn.execute('INSERT INTO results (model_name, doc_internal_id, category, prompt, response, score) '
+                  "VALUES ('d', 0, 'x', 'Pergunta 0: ', 'nova', 2)")
+    conn.execute("UPDATE results SET model_name = 'renamed', response = 'outra' WHERE model_name = 'a'")
+    conn.execute("DELETE FROM results WHERE model_name = 'b'")
+    assert conn.execute("SELECT response FROM results WHERE model_name = 'd'").fetchone() == ('nova',)
+    assert {row[0] for row in conn.execute("SELECT response FROM results WHERE model_name = 'renamed'")} == {'outra'}
+    assert conn.execute("SELECT COUNT(*) FROM results WHERE model_name IN ('a', 'b')").fetchone()[0] == 0
+    # The new row reused the stored prompt; deleting rows leaves prompts other rows use
+    assert prune_prompts(conn) == 0
@@ -0,0 +1,92 @@
+"""Conversation threads: every model's turns of a conversation side by side.
+
+The conversations DB names a conversation 'p12', and its pt-pt prompt
+variant 'p12t'. Provisioning adds `conversation_num`, a virtual generated
+column holding the number, plus indexes that lead with it, so threads are
+paged, filtered and ordered on integers in SQL. DBs that could not be
+provisioned fall back to computing the number in each query.
+"""
+from queries import as_int, build_where
+
+# SQL for the number in a conversation id ('p12t' -> 12)
+CONVERSATION_NUM = "CAST(replace(replace({prefix}conversation_id, 'p', ''), 't', '') AS INTEGER)"
+
+THREADS_PER_PAGE = 10
+
+# Columns provisioning adds for the viewer's own use; not part of the data (left out of exports)
+PROVISIONED_COLUMNS = ('conversation_num',)
+
+
+def ensure_conversation_num(conn):
+    """Add the generated `conversation_num` column to a conversations `evaluations` table.
+
+    Returns True if the column was added.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_xinfo(evaluations)')}
+    if 'conversation_id' not in columns or 'conversation_num' in columns:
+        return False
+    conn.execute('ALTER TABLE evaluations ADD COLUMN conversation_num INTEGER '
+                 f"GENERATED ALWAYS AS ({CONVERSATION_NUM.format(prefix='')}) VIRTUAL")
+    conn.commit()
+    return True
+
+
+def conversation_num(columns, prefix=''):
+    """The conversation number of a row: the generated column if present, else the expression."""
+    if 'conversation_num' in columns:
+        return f'{prefix}conversation_num'
+    return CONVERSATION_NUM.format(prefix=prefix)
+
+
+def fetch_threads(cursor, table, columns, args, select, page=1, per_page=THREADS_PER_PAGE):
+    """One page of threads: every turn of every model, fetched in one query.
+
+    A thread is a (conversation number, pt-pt prompt) pair. `args` may name
+    several `model`s (default: all), one `conversation` and `pt_pt_prompt`.
+    `select` is the column list for `e`, the table's rows (see
+    views.list_columns). `page` is 1-based.
+
+    Returns (threads, models, total): threads as dicts with `conversation`,
+    `pt_pt` and `turns`, each turn holding the rows of that turn by model.
+    """
+    num = conversation_num(columns)
+    where, params = build_where((('conversation', num, as_int), ('pt_pt_prompt', 'used_pt_pt_prompt', as_int)),
+                                args, score=False)
+    models = [model for model in args.getlist('model') if model]
+    model_where = ''
+    if models:
+        model_where = f" AND e.model_name IN ({', '.join('?' * len(models))})"
+        where += f" AND model_name IN ({', '.join('?' * len(models))})"
+        params += models
+
+    total = cursor.execute(f'SELECT COUNT(*) FROM (SELECT DISTINCT {num}, used_pt_pt_prompt FROM {table}{where})',
+                           params).fetchone()[0]
+    rows = cursor.execute(f'''
+        WITH page AS (
+            SELECT DISTINCT {num} AS num, used_pt_pt_prompt AS pt_pt
+            FROM {table}{where}
+            ORDER BY num, pt_pt
+            LIMIT {per_page} OFFSET {(page - 1) * per_page}
+        )
+        SELECT page.num AS thread_num, page.pt_pt AS thread_pt_pt, {select}
+        FROM page JOIN {table} e ON {conversation_num(columns, 'e.')} = page.num AND e.used_pt_pt_prompt = page.pt_pt
+        WHERE 1=1{model_where}
+        ORDER BY page.num, page.pt_pt, e.turn_number, e.model_name
+    ''', params + models).fetchall()
+
+    threads, seen = [], {}
+    for row in rows:
+        if not threads or (threads[-1]['conversation'], threads[-1]['pt_pt']) != (row['thread_num'],
+                                                                                 row['thread_pt_pt']):
+            threads.append({'conversation': row['thread_num'], 'pt_pt': row['thread_pt_pt'], 'turns': []})
+        turns = threads[-1]['turns']
+        if not turns or turns[-1]['turn_number'] != row['turn_number']:
+            turns.append({'turn_number': row['turn_number'], 'cells': {}})
+        turns[-1]['cells'][row['model_name']] = row
+        seen[row['model_name']] = None
+    for thread in threads:
+        for turn in thread['turns']:
+            # Show the context once when every model was given the same one
+            contexts = {row['context'] for row in turn['cells'].values()}
+            turn['context'] = contexts.pop() if len(contexts) == 1 else None
+    return threads, models or sorted(seen), total
@@ -0,0 +1,319 @@
+"""Declarative list views.
+
+A `ViewSpec` says which table a list page reads, which query args filter
+which columns, how rows are ordered, how many fit on a page and which
+template renders them. `detect_spec` picks the spec whose columns a DB
+actually has (via PRAGMA table_xinfo), so routing follows the schema rather
+than the file name, and a DB that matches none of `SPECS` still gets a
+generic spec built from its columns. `list_context` is the one code path
+every list page and API endpoint goes through: filters, search, stats,
+intervals, score histograms, preview columns and keyset pagination.
+"""
+from collections import namedtuple
+from functools import cache, partial
+
+from flask import abort
+
+from cache import LRUCache, db_cached
+from queries import (CONVERSATION_KEY, CONVERSATION_NUM_KEY, ID_KEY, as_int, bin_width, build_where, fetch_page,
+                     preview_columns, score_buckets, score_stats)
+from search import TEXT_COLUMNS, fetch_search_page, has_fts, search_filter
+from significance import bootstrap_ci
+
+# A filter maps query arg `arg` to `column = convert(value, args)`
+Filter = namedtuple('Filter', 'arg column convert')
+
+# facets: (template variable, options(conn, table)) for the filter dropdowns.
+# toggles: {query arg: column} for columns left out unless the arg is on.
+# prepare: optional function applied to each page of rows before rendering.
+# breakdown: (column, label) the score heatmap splits models by, or None.
+ViewSpec = namedtuple('ViewSpec', 'name table requires template key descending per_page filters facets '
+                                  'text_columns toggles prepare breakdown')
+
+# Tables the viewer maintains itself; never offered as a generic view
+INTERNAL_TABLES = ('leaderboard', 'leaderboard_state', 'import_progress', 'model_aliases')
+
+facet_cache = LRUCache(maxsize=64)
+# Bootstrap intervals are deterministic per DB version and filter
+interval_cache = LRUCache(maxsize=256)
+# Histogram and heatmap buckets, per DB version and filter
+panel_cache = LRUCache(maxsize=256)
+
+
+def as_text(value, args):
+    return value
+
+
+def conversation_id(value, args):
+    # The dropdown lists '12' once; 'p12t' is its pt-pt prompt variant
+    return f"p{value}{'t' if args.get('pt_pt_prompt', '') == '1' else ''}"
+
+
+def conversation_variant(value, args):
+    # With `conversation_num`: `conversation` picks 'p12' (0) unless pt_pt_prompt=1, as `conversation_id` does
+    return 1 if args.get('pt_pt_prompt', '') == '1' else 0
+
+
+def column_options(column):
+    """Facet listing the distinct values of `column` as [{column: value}]."""
+    def options(conn, table):
+        query = f'SELECT DISTINCT {column} FROM {table} ORDER BY {column}'
+        return db_cached(facet_cache, conn, (table, column),
+                         lambda: [dict(row) for row in conn.execute(query)])
+    return options
+
+
+def conversation_options(conn, table):
+    # 'p12' and its pt-pt variant 'p12t' are listed once, as '12', in numeric order
+    def compute():
+        if 'conversation_num' in {name for name, _ in table_info(conn, table)}:
+            rows = conn.execute(f'SELECT DISTINCT conversation_num FROM {table} ORDER BY conversation_num')
+            return [{'conversation_id': f'{row[0]}'} for row in rows]
+        rows = conn.execute(f'SELECT DISTINCT conversation_id FROM {table}')
+        numbers = {int(row[0].replace('p', '').replace('t', '')) for row in rows}
+        return [{'conversation_id': f"{number}"} for number in sorted(numbers)]
+    return db_cached(facet_cache, conn, (table, 'conversation_options'), compute)
+
+
+def prepare_conversations(rows):
+    results = []
+    for row in rows:
+        row = dict(row)
+        row['conversation_id'] = int(row['conversation_id'].replace('p', '').replace('t', ''))
+        results.append(row)
+    results.sort(key=lambda x: (x['conversation_id'], x['turn_number']))
+    return results
+
+
+def prepare_numbered_conversations(rows):
+    # Already in numeric order (see CONVERSATION_NUM_KEY)
+    results = []
+    for row in rows:
+        row = dict(row)
+        row['conversation_id'] = row['conversation_num']
+        results.append(row)
+    return results
+
+
+MODEL = Filter('model', 'model_name', as_text)
+MODELS = ('models', column_options('model_name'))
+PT_PT_PROMPT = Filter('pt_pt_prompt', 'used_pt_pt_prompt', as_int)
+PT_PT_BREAKDOWN = ('used_pt_pt_prompt', 'PT-PT Prompt')
+
+# Tried in order; the conversation DB's table is also called `evaluations`.
+# The first conversations spec needs the `conversation_num` column that
+# provisioning adds (see threads.py); the second serves DBs without it.
+SPECS = (
+    ViewSpec('conversations', 'evaluations', ('conversation_num', 'turn_number'), 'conversations.html',
+             CONVERSATION_NUM_KEY, False, 20,
+             (MODEL, Filter('conversation', 'conversation_num', as_int),
+              Filter('conversation', 'used_pt_pt_prompt', conversation_variant), PT_PT_PROMPT),
+             (MODELS, ('conversations_list', conversation_options)),
+             TEXT_COLUMNS, {'show_raw': 'raw_output'}, prepare_numbered_conversations, PT_PT_BREAKDOWN),
+    ViewSpec('conversations', 'evaluations', ('conversation_id', 'turn_number'), 'conversations.html',
+             CONVERSATION_KEY, False, 20,
+             (MODEL, Filter('conversation', 'conversation_id', conversation_id), PT_PT_PROMPT),
+             (MODELS, ('conversations_list', conversation_options)),
+             TEXT_COLUMNS, {'show_raw': 'raw_output'}, prepare_conversations, PT_PT_BREAKDOWN),
+    ViewSpec('evaluations', 'evaluations', ('group_name',), 'evaluations.html', ID_KEY, True, 50,
+             (MODEL, Filter('group', 'group_name', as_text)),
+             (MODELS, ('groups', column_options('group_name'))),
+             TEXT_COLUMNS, {}, None, ('group_name', 'Group')),
+    ViewSpec('results', 'results', ('category',), 'index.html', ID_KEY, True, 50,
+             (MODEL, Filter('category', 'category', as_text)),
+             (MODELS, ('categories', column_options('category'))),
+             TEXT_COLUMNS, {}, None, ('category', 'Category')),
+)
+
+
+def table_info(conn, table):
+    """[(column name, declared type)] of `table`, in table order, generated columns included."""
+    # table_xinfo's `hidden` is 1 for a virtual table's hidden columns, 2/3 for generated ones
+    return [(row[1], row[2].upper()) for row in conn.execute(f'PRAGMA table_xinfo({table})') if row[6] != 1]
+
+
+def generic_spec(conn):
+    """Spec for a DB none of SPECS fits: its first user table, every column shown."""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+        "AND sql NOT LIKE 'CREATE VIRTUAL%' ORDER BY rowid")]
+    tables = [t for t in tables if t not in INTERNAL_TABLES and not t.endswith(('_fts_data', '_fts_idx',
+                                                                               '_fts_docsize', '_fts_config'))]
+    if not tables:
+        return None
+    table = tables[0]
+    info = table_info(conn, table)
+    columns = [name for name, _ in info]
+    filters, facets = (), ()
+    if 'model_name' in columns:
+        filters, facets = (MODEL,), (MODELS,)
+    key = ID_KEY if 'id' in columns else (('rowid', int),)
+    text = tuple(name for name, kind in info
+                 if name in TEXT_COLUMNS or ('TEXT' in kind and name != 'model_name' and not name.endswith('_id')))
+    return ViewSpec(table, table, (), 'table.html', key, True, 50, filters, facets, text, {}, None, None)
+
+
+def detect_spec(conn):
+    """The view spec for this DB, decided by its schema (cached per file version)."""
+    def compute():
+        for spec in SPECS:
+            columns = {name for name, _ in table_info(conn, spec.table)}
+            if {'score', *spec.requires, *(f.column for f in spec.filters)} <= columns:
+                return spec
+        return generic_spec(conn)
+    return db_cached(facet_cache, conn, 'view_spec', compute)
+
+
+def list_columns(conn, spec, prefix='', exclude=()):
+    # List pages only carry previews of the long text columns (see /row)
+    def compute():
+        columns = [name for name, _ in table_info(conn, spec.table) if name not in exclude]
+        if spec.key[-1][0] == 'rowid':
+            columns.insert(0, 'rowid')
+        return preview_columns(columns, prefix, long_columns=spec.text_columns)
+    return db_cached(facet_cache, conn, ('list_columns', spec.table, prefix, exclude), compute)
+
+
+def score_panels(conn, spec, where, params):
+    """Score histogram, model × breakdown heatmap and bootstrap intervals of the filtered rows.
+
+    All come from one bucketing query (queries.score_buckets). Returns
+    {'histogram': [(bin start, count)], 'bin_width', 'score_range',
+    'heatmap'}, where `heatmap` is None without a model column or breakdown,
+    plus 'mean_ci' and 'median_ci' when NumPy is available.
+
+    The intervals resample the bins, each standing for its scores' mean.
+    That is exact when a bin holds a single score value, as on 1-5 and 0-10
+    scales with integer scores; otherwise (wider scales, fractional scores
+    on 0-10) the spread within each bin is lost and the intervals come out
+    slightly narrow.
+    """
+    def compute():
+        cursor = conn.cursor()
+        width = db_cached(facet_cache, conn, ('bin_width', spec.table), lambda: bin_width(cursor, spec.table))
+        model = 'model_name' if 'model_name' in {name for name, _ in table_info(conn, spec.table)} else None
+        group = spec.breakdown[0] if spec.breakdown else None
+        bins, bin_sums, cells = {}, {}, {}
+        for model_name, grp, start, count, total in score_buckets(cursor, spec.table, where, params, width,
+                                                                   model, group):
+            bins[start] = bins.get(start, 0) + count
+            bin_sums[start] = bin_sums.get(start, 0) + total
+            n, score_sum = cells.get((model_name, grp), (0, 0))
+            cells[(model_name, grp)] = (n + count, score_sum + total)
+        if not bins:
+            return {'histogram': [], 'bin_width': width, 'score_range': (0, 0), 'heatmap': None}
+        low, high = min(bins), max(bins)
+        # Empty bins between the lowest and highest score are drawn too
+        histogram = [(low + i * width, bins.get(low + i * width, 0)) for i in range(round((high - low) / width) + 1)]
+        heatmap = None
+        if model and group:
+            heatmap = {
+                'label': spec.breakdown[1],
+                'models': sorted({m for m, _ in cells}),
+                'groups': sorted({g for _, g in cells}),
+                'cells': {key: (score_sum / n, n) for key, (n, score_sum) in cells.items()},
+            }
+        intervals = bootstrap_ci([bin_sums[start] / n for start, n in bins.items()], list(bins.values())) or {}
+        return {'histogram': histogram, 'bin_width': width, 'score_range': (low, high + width), 'heatmap': heatmap,
+                **intervals}
+    return db_cached(panel_cache, conn, ('panels', spec.table, where, tuple(params)), compute)
+
+
+def is_on(value):
+    return str(value).lower() in ('1', 'on', 'true')
+
+
+def page_arg(args):
+    """The 1-based `page` number in `args`, or a 400 if it is not an integer."""
+    try:
+        return max(1, int(args.get('page', 1)))
+    except ValueError:
+        abort(400, 'page must be an integer')
+
+
+def has_score(conn, spec):
+    return 'score' in {name for name, _ in table_info(conn, spec.table)}
+
+
+def filter_query(conn, spec, args):
+    """WHERE clause and params for the filters and text search in `args`.
+
+    Returns (where, params, search_where, search_params): the second pair
+    also carries the `q` search condition.
+    """
+    try:
+        where, params = build_where(spec.filters, args, has_score(conn, spec))
+    except ValueError as e:
+        # A filter value its converter cannot read, e.g. ?conversation=abc
+        abort(400, f'Invalid filter value: {e}')
+    search_where, search_params = search_filter(conn, spec.table, args.get('q', ''), where, params)
+    return where, params, search_where, search_params
+
+
+def list_context(conn, spec, args):
+    """Everything a list template needs for the request `args`.
+
+    The page of rows is fetched up front. The stats, facets and panels
+    (score_panels) are callables, run once where the template first calls
+    them, so a streamed page (see streaming.py) has sent its head and
+    result cards before those queries start.
+    """
+    cursor = conn.cursor()
+    q = args.get('q', '')
+    page = page_arg(args)
+    # Keyset cursors of the neighbouring page (see queries.fetch_page)
+    after = args.get('after', '')
+    before = args.get('before', '')
+    toggles = {arg: is_on(args.get(arg, '')) for arg in spec.toggles}
+    exclude = tuple(column for arg, column in spec.toggles.items() if not toggles[arg])
+    scored = has_score(conn, spec)
+
+    where, params, search_where, search_params = filter_query(conn, spec, args)
+
+    @cache
+    def stats():
+        if scored:
+            values = score_stats(conn.cursor(), spec.table, search_where, search_params)
+        else:
+            values = {'total_count': conn.execute(f'SELECT COUNT(*) FROM {spec.table}{search_where}',
+                                                  search_params).fetchone()[0]}
+        values['total_pages'] = (values['total_count'] + spec.per_page - 1) // spec.per_page
+        return values
+
+    @cache
+    def panels():
+        if not scored:
+            return {}
+        return score_panels(conn, spec, search_where, search_params)
+
+    if q.strip() and has_fts(conn, spec.table):
+        # Ranked matches are paged by number; there is no stable key to seek on
+        results = fetch_search_page(cursor, spec.table, q, where, params, spec.per_page, page,
+                                    list_columns(conn, spec, 't.', exclude))
+        prev_cursor = next_cursor = ''
+    else:
+        results, prev_cursor, next_cursor = fetch_page(cursor, spec.table, search_where, search_params, spec.key,
+                                                       spec.descending, spec.per_page, page, after, before,
+                                                       list_columns(conn, spec, exclude=exclude))
+    if spec.prepare:
+        results = spec.prepare(results)
+
+    context = {
+        'spec': spec,
+        'results': results,
+        'q': q,
+        'page': page,
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
+        'scored': scored,
+        'stats': stats,
+        'panels': panels,
+        'min_score': args.get('min_score', ''),
+        'max_score': args.get('max_score', ''),
+        **toggles,
+    }
+    for name, options in spec.facets:
+        context[name] = cache(partial(options, conn, spec.table))
+    for f in spec.filters:
+        context[f'selected_{f.arg}'] = args.get(f.arg, '')
+    return context